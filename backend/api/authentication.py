@@ -0,0 +1,139 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.constants import (
+    TOKEN_CACHE_LOCAL_TIMEOUT,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_TIMEOUT
+)
+from foodgram.metrics import registry
+
+CACHE_PREFIX = 'auth-token'
+
+
+def cache_key(key):
+    """
+    Ключ кэша по хэшу токена: сами токены в кэш не попадают.
+    """
+    return f'{CACHE_PREFIX}:{sha256(key.encode()).hexdigest()}'
+
+
+class LocalTokenCache:
+    """
+    Ограниченный по размеру LRU-кэш пользователей по токену в памяти
+    процесса; записи живут TOKEN_CACHE_LOCAL_TIMEOUT секунд.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            user, expires = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        with self._lock:
+            self._items[key] = (user, time.monotonic() + self.timeout)
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+local_cache = LocalTokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_LOCAL_TIMEOUT)
+
+
+def invalidate_token(key):
+    """
+    Удаляет токен из кэша процесса и общего кэша.
+
+    Кэши других процессов забывают токен не позже чем через
+    TOKEN_CACHE_LOCAL_TIMEOUT секунд: без общего кэша (CACHE_IS_SHARED)
+    второй уровень не используется, и другие процессы держат токен
+    только в своем кэше.
+    """
+    key = cache_key(key)
+    local_cache.delete(key)
+    cache.delete(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, запоминающая пользователя по токену.
+
+    Пользователь ищется в кэше процесса, затем в общем кэше и только
+    потом в базе. Общий кэш используется, только если он виден всем
+    процессам: кэш в памяти процесса хранил бы вышедший токен еще
+    TOKEN_CACHE_TIMEOUT секунд в процессах, не обработавших выход.
+    Изменяющие запросы всегда читают пользователя из базы, чтобы
+    сохранение профиля не записало устаревшие поля. Хэш пароля в кэш
+    не попадает: поле password отложено и при обращении читается
+    из базы.
+    """
+
+    def authenticate(self, request):
+        self.use_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if not getattr(self, 'use_cache', False):
+            return super().authenticate_credentials(key)
+
+        name = cache_key(key)
+        user = local_cache.get(name)
+        source = 'local'
+        if user is None and settings.CACHE_IS_SHARED:
+            user = cache.get(name)
+            source = 'shared'
+        if user is None:
+            user = self.get_user(key)
+            source = 'database'
+            if settings.CACHE_IS_SHARED:
+                cache.set(name, user, TOKEN_CACHE_TIMEOUT)
+        if source != 'local':
+            local_cache.set(name, user)
+        registry.increment('token_cache_lookups_total', source)
+
+        user = copy.copy(user)
+        token = Token(key=key, user_id=user.pk)
+        token.user = user
+        return user, token
+
+    def get_user(self, key):
+        try:
+            token = Token.objects.select_related('user').defer(
+                'user__password').get(key=key)
+        except Token.DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user
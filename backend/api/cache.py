@@ -0,0 +1,124 @@
+import time
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from foodgram.constants import RESPONSE_CACHE_TIMEOUT
+
+CACHE_PREFIX = 'response-cache'
+
+
+def get_response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def generation_key(scope):
+    return f'{CACHE_PREFIX}:generation:{scope}'
+
+
+def get_generations(scopes):
+    """
+    Возвращает текущие поколения данных для перечисленных областей.
+
+    Если счетчик пропал из кэша, он создается заново со значением
+    от текущего времени, чтобы не совпасть с прежними поколениями.
+    """
+    response_cache = get_response_cache()
+    keys = [generation_key(scope) for scope in scopes]
+    generations = response_cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            initial = time.time_ns()
+            response_cache.add(key, initial, timeout=None)
+            generations[key] = response_cache.get(key, initial)
+    return [generations[key] for key in keys]
+
+
+def bump_generation(*scopes):
+    """
+    Переводит области на новое поколение, делая их кэш неактуальным.
+    """
+    response_cache = get_response_cache()
+    for scope in scopes:
+        try:
+            response_cache.incr(generation_key(scope))
+        except ValueError:
+            response_cache.set(
+                generation_key(scope), time.time_ns(), timeout=None)
+
+
+class ResponseCacheMixin:
+    """
+    Кэширует ответы list и retrieve.
+
+    Ключ строится из адреса запроса и поколений областей cache_scopes,
+    поэтому изменение данных не требует поиска и удаления старых ключей.
+    Общий для всех пользователей ответ дополняется персональными данными
+    в personalize_response_data. ETag выводится из ключа, и на
+    If-None-Match с актуальным значением отдается 304 без обращения
+    к кэшу. Кэширование включено при общем кэше или одном процессе
+    сервера (CACHE_IS_COHERENT): иначе поколения, увеличенные одним
+    процессом, не были бы видны остальным.
+    """
+    cache_scopes = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().retrieve, *args, **kwargs)
+
+    def is_response_cacheable(self, request):
+        return settings.CACHE_IS_COHERENT and request.method == 'GET'
+
+    def get_cache_scopes(self):
+        return self.cache_scopes
+
+    def get_response_cache_key(self, request):
+        generations = ':'.join(
+            str(generation) for generation in get_generations(
+                self.get_cache_scopes()))
+        url = md5(request.build_absolute_uri().encode()).hexdigest()
+        return (
+            f'{CACHE_PREFIX}:{self.basename}:{self.action}:'
+            f'{generations}:{url}'
+        )
+
+    def get_response_cache_timeout(self):
+        return RESPONSE_CACHE_TIMEOUT
+
+    def get_response_etag(self, request, key):
+        return quote_etag(md5(key.encode()).hexdigest())
+
+    def personalize_response_data(self, request, data):
+        return data
+
+    def get_cached_response(self, request, handler, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return handler(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        etag = self.get_response_etag(request, key)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response_cache = get_response_cache()
+            data = response_cache.get(key)
+            if data is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                response_cache.set(
+                    key, response.data, self.get_response_cache_timeout())
+                data = response.data
+            response = Response(self.personalize_response_data(request, data))
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        return response
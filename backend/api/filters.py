@@ -1,23 +1,75 @@
+from django.db.models import Case, IntegerField, Value, When
+from django_filters.fields import MultipleChoiceField
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from foodgram.constants import INGREDIENT_SEARCH_LIMIT
+from recipes.models import Ingredient, Recipe
+from recipes.registry import tag_registry
 
 
 class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr='startswith')
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    def filter_name(self, queryset, name, value):
+        """
+        Ищет ингредиенты по подстроке без учета регистра: сначала
+        совпадения по началу названия, затем остальные.
+        """
+        return queryset.filter(name__icontains=value).annotate(
+            rank=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('rank', 'name')[:INGREDIENT_SEARCH_LIMIT]
+
+
+def tag_choices():
+    return tag_registry.choices()
+
+
+class TagSlugField(MultipleChoiceField):
+    """
+    Проверяет слаги по реестру тегов, который перечитывается, если
+    слаг не найден: тег мог появиться в другом процессе.
+    """
+
+    def valid_value(self, value):
+        return tag_registry.get_by_slug(value) is not None
+
+
+class TagSlugFilter(filters.MultipleChoiceFilter):
+    """
+    Фильтр по слагам тегов: слаги проверяются и переводятся в id
+    по реестру тегов, без запроса к таблице тегов.
+    """
+    field_class = TagSlugField
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('choices', tag_choices)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        tag_ids = [
+            tag.id for tag in map(tag_registry.get_by_slug, value) if tag
+        ]
+        return qs.filter(tags__in=tag_ids).distinct()
+
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
-    )
+    tags = TagSlugFilter()
 
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'По популярности'),),
+        method='get_ordering',
+    )
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
@@ -27,6 +79,18 @@ class RecipeFilter(FilterSet):
         model = Recipe
         fields = ('tags', 'author',)
 
+    def get_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию, описанию и ингредиентам.
+        """
+        return queryset.search(value)
+
+    def get_ordering(self, queryset, name, value):
+        """
+        Сортирует рецепты по числу добавлений в избранное.
+        """
+        return queryset.popular()
+
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
@@ -0,0 +1,112 @@
+from array import array
+from bisect import bisect_left
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.constants import USER_FLAGS_CACHE_TIMEOUT
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+FLAG_SOURCES = {
+    'favorites': (Favorite, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+    'following': (Follow, 'author_id'),
+}
+
+
+def flags_key(user_id):
+    return f'user-flags:{user_id}'
+
+
+class UserFlags:
+    """
+    Отсортированные множества id избранного, корзины и подписок
+    пользователя, упакованные в array('q').
+    """
+
+    def __init__(self, favorites=b'', shopping_cart=b'', following=b''):
+        self.favorites = array('q', favorites)
+        self.shopping_cart = array('q', shopping_cart)
+        self.following = array('q', following)
+
+    @classmethod
+    def load(cls, user):
+        """
+        Берет множества пользователя из кэша или загружает их из базы.
+
+        Без общего кэша при нескольких процессах (CACHE_IS_COHERENT)
+        множества загружаются на каждый запрос: сброс после изменения
+        не дошел бы до других процессов.
+        """
+        if not user.is_authenticated:
+            return cls()
+        if not settings.CACHE_IS_COHERENT:
+            return cls(**cls.fetch(user))
+        packed = cache.get(flags_key(user.id))
+        if packed is None:
+            packed = cls.fetch(user)
+            cache.set(flags_key(user.id), packed, USER_FLAGS_CACHE_TIMEOUT)
+        return cls(**packed)
+
+    @staticmethod
+    def fetch(user):
+        return {
+            kind: array('q', sorted(
+                model.objects.filter(user=user).values_list(
+                    field, flat=True)
+            )).tobytes()
+            for kind, (model, field) in FLAG_SOURCES.items()
+        }
+
+    @staticmethod
+    def invalidate(user_id):
+        cache.delete(flags_key(user_id))
+
+    @staticmethod
+    def _contains(values, value):
+        position = bisect_left(values, value)
+        return position < len(values) and values[position] == value
+
+    def is_favorited(self, recipe_id):
+        return self._contains(self.favorites, recipe_id)
+
+    def is_in_shopping_cart(self, recipe_id):
+        return self._contains(self.shopping_cart, recipe_id)
+
+    def is_following(self, author_id):
+        return self._contains(self.following, author_id)
+
+    @property
+    def digest(self):
+        """
+        Короткий отпечаток множеств для построения ETag.
+        """
+        return md5(
+            self.favorites.tobytes()
+            + b'|' + self.shopping_cart.tobytes()
+            + b'|' + self.following.tobytes()
+        ).hexdigest()
+
+    def overlay_recipe(self, recipe):
+        """
+        Проставляет флаги пользователя в сериализованный рецепт.
+        """
+        recipe['is_favorited'] = self.is_favorited(recipe['id'])
+        recipe['is_in_shopping_cart'] = self.is_in_shopping_cart(recipe['id'])
+        if recipe.get('author') is not None:
+            recipe['author']['is_subscribed'] = self.is_following(
+                recipe['author']['id'])
+        return recipe
+
+
+def get_user_flags(request):
+    """
+    Возвращает флаги пользователя запроса, загружая их один раз.
+    """
+    flags = getattr(request, '_user_flags', None)
+    if flags is None:
+        flags = UserFlags.load(request.user)
+        request._user_flags = flags
+    return flags
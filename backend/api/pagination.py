@@ -1,6 +1,187 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from collections import OrderedDict
+from hashlib import md5
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+from foodgram.constants import PAGINATION_COUNT_CACHE_TIMEOUT
+
+
+def estimate_count(queryset):
+    """
+    Оценивает количество записей в выборке.
+
+    В PostgreSQL берется оценка планировщика из EXPLAIN, которая для
+    выборки без условий равна pg_class.reltuples. В остальных базах
+    точное количество кэшируется на PAGINATION_COUNT_CACHE_TIMEOUT.
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    key = 'pagination:count:' + md5(
+        f'{sql}{params!r}'.encode()).hexdigest()
+    return cache.get_or_set(
+        key, queryset.count, PAGINATION_COUNT_CACHE_TIMEOUT)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная пагинация по убыванию id или по явной сортировке выборки.
+
+    Следующая страница выбирается условием по ключу сортировки вместо
+    OFFSET, поэтому дальние страницы стоят столько же, сколько первая.
+    При сортировке по нескольким полям (популярность, рейтинг, id)
+    позицией служат значения всех полей: DRF позиционирует курсор только
+    по первому полю и на длинных сериях одинаковых значений упирается
+    в offset_cutoff. Общее количество по умолчанию не считается:
+    count=exact возвращает точное значение, count=estimate - оценку.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            self.count = queryset.count()
+        elif mode == 'estimate':
+            self.count = estimate_count(queryset)
+        else:
+            self.count = None
+
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, position = self.cursor or (0, False, None)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                item[1:] if item.startswith('-') else f'-{item}'
+                for item in ordering
+            )
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(position, reverse))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(
+                results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None or offset > 0
+            self.has_previous = following is not None
+            self.next_position = position
+            self.previous_position = following
+        else:
+            self.has_next = following is not None
+            self.has_previous = position is not None or offset > 0
+            self.next_position = following
+            self.previous_position = position
+        self.display_page_controls = self.has_previous or self.has_next
+        return self.page
+
+    def get_position_filter(self, position, reverse):
+        """
+        Условие выборки записей после позиции курсора.
+
+        Для сортировки (a, b, c) это a < A, или a = A и b < B, или
+        a = b = ... и c < C с учетом направления каждого поля.
+        """
+        if len(self.ordering) == 1:
+            values = [position]
+        else:
+            try:
+                values = json.loads(position)
+            except ValueError:
+                values = None
+            if (
+                not isinstance(values, list)
+                or len(values) != len(self.ordering)
+            ):
+                raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        equal = {}
+        for item, value in zip(self.ordering, values):
+            name = item.lstrip('-')
+            lookup = 'lt' if reverse != item.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        if len(ordering) == 1:
+            return super()._get_position_from_instance(instance, ordering)
+        return json.dumps([
+            getattr(instance, item.lstrip('-')) for item in ordering
+        ], cls=DjangoJSONEncoder)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Сохраняет явную сортировку выборки по полям или аннотациям
+        (популярность, рейтинг), иначе сортирует по убыванию id.
+        """
+        ordering = tuple(queryset.query.order_by)
+        names = set(queryset.query.annotations) | {
+            field.attname for field in queryset.model._meta.concrete_fields
+        }
+        if ordering and all(
+            isinstance(item, str) and item.lstrip('-') in names
+            for item in ordering
+        ):
+            return ordering
+        return super().get_ordering(request, queryset, view)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+            response.move_to_end('count', last=False)
+        return Response(response)
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Постраничная пагинация, переключающаяся на курсорную,
+    если в запросе передан параметр cursor (для первой страницы - пустой).
+    """
     page_size = 6
     page_size_query_param = "limit"
+    cursor_query_param = 'cursor'
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
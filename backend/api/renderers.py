@@ -0,0 +1,89 @@
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Базовый рендерер для выбора формата списка покупок.
+
+    Сам файл отдается потоковым ответом, а ошибки - в JSON, поэтому
+    рендерер используется только при согласовании формата.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode(self.charset)
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """
+    Отдает список покупок первым форматом (txt), если заголовок Accept
+    не совпал ни с одним из форматов списка: клиенты, запрашивающие
+    application/json, получали файл и до выбора форматов. Неизвестный
+    параметр format по-прежнему дает 404.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson, если он установлен.
+
+    Вывод побайтно совпадает с JSONRenderer при настройках DRF по
+    умолчанию: компактный UTF-8 без NaN, с экранированием U+2028 и
+    U+2029. Форматы чисел с плавающей точкой у orjson и json различаются
+    (1e16 и 1e+16), поэтому рендерер рассчитан на ответы без таких
+    чисел; API их не отдает. Отступы и нестандартные настройки
+    обрабатывает JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        encoder = self.encoder_class()
+        ret = orjson.dumps(
+            data,
+            default=encoder.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
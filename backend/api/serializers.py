@@ -1,18 +1,56 @@
+from collections import Counter
+
+from django.db import transaction
 from django.db.models import F
-from django.shortcuts import get_object_or_404
 
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework.exceptions import ValidationError
-from rest_framework.fields import IntegerField, SerializerMethodField
+from rest_framework.fields import (
+    ImageField,
+    IntegerField,
+    ListField,
+    SerializerMethodField
+)
 from rest_framework.relations import PrimaryKeyRelatedField
-from rest_framework.serializers import ModelSerializer
-
-from foodgram.constants import INGREDIENT_MIN_AMOUNT, COOKING_TIME_MIN_VALUE
-from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from rest_framework.serializers import ModelSerializer, Serializer
+
+from api.compiled import CompiledReadMixin
+from api.flags import get_user_flags
+from foodgram.constants import (
+    BATCH_MAX_SIZE,
+    COOKING_TIME_MIN_VALUE,
+    INGREDIENT_MIN_AMOUNT
+)
+from recipes.images import get_variant_urls
+from recipes.models import (
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingListItem,
+    Tag
+)
+from recipes.registry import tag_registry
 from users.serializers import CustomUserSerializer
 
 
-class IngredientSerializer(ModelSerializer):
+class TagPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    """
+    Поле тега по id, проверяемое по реестру тегов без запроса к базе.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            tag = tag_registry.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return tag
+
+
+class IngredientSerializer(CompiledReadMixin, ModelSerializer):
     """
     Сериализатор для ингредиентов.
     """
@@ -21,7 +59,7 @@ class IngredientSerializer(ModelSerializer):
         fields = '__all__'
 
 
-class TagSerializer(ModelSerializer):
+class TagSerializer(CompiledReadMixin, ModelSerializer):
     """
     Сериализатор для тегов.
     """
@@ -30,14 +68,15 @@ class TagSerializer(ModelSerializer):
         fields = '__all__'
 
 
-class RecipeReadSerializer(ModelSerializer):
+class RecipeReadSerializer(CompiledReadMixin, ModelSerializer):
     """
     Сериализатор для чтения рецепта.
     """
     tags = TagSerializer(many=True, read_only=True)
     ingredients = SerializerMethodField(method_name='get_ingredients')
     author = CustomUserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = ImageField(read_only=True)
+    images = SerializerMethodField(method_name='get_images')
     is_favorited = SerializerMethodField(
         method_name='get_is_favorited', read_only=True)
     is_in_shopping_cart = SerializerMethodField(
@@ -55,14 +94,42 @@ class RecipeReadSerializer(ModelSerializer):
             'name',
             'text',
             'image',
+            'images',
             'cooking_time',
         )
 
+    def to_representation(self, instance):
+        """
+        Передает автору аннотацию подписки, полученную вместе с рецептом.
+        """
+        is_subscribed = getattr(instance, 'is_author_subscribed', None)
+        if is_subscribed is not None and instance.author is not None:
+            instance.author.is_subscribed = is_subscribed
+        return super().to_representation(instance)
+
+    def get_images(self, obj):
+        """
+        Возвращает адреса уменьшенных копий изображения.
+        """
+        return get_variant_urls(obj, self.context.get('request'))
+
     def get_ingredients(self, obj):
         """
         Возвращает список ингредиентов рецепта.
         """
         recipe = obj
+        if 'ingredientinrecipes' in getattr(
+                recipe, '_prefetched_objects_cache', {}):
+            ingredients = []
+            for item in recipe.ingredientinrecipes.all():
+                ingredient = item.ingredient
+                ingredients.append({
+                    'id': ingredient.id,
+                    'name': ingredient.name,
+                    'measurement_unit': ingredient.measurement_unit,
+                    'amount': item.amount,
+                })
+            return ingredients
         ingredients = recipe.ingredients.values(
             'id',
             'name',
@@ -75,23 +142,19 @@ class RecipeReadSerializer(ModelSerializer):
         """
         Проверяет, добавлен ли рецепт в избранное текущим пользователем.
         """
-        user = self.context.get('request').user
-
-        return (
-            user.is_authenticated
-            and user.favorites.filter(recipe=obj).exists()
-        )
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        request = self.context.get('request')
+        return get_user_flags(request).is_favorited(obj.id)
 
     def get_is_in_shopping_cart(self, obj):
         """
         Проверяет, добавлен ли рецепт в корзину покупок текущим пользователем.
         """
-        user = self.context.get('request').user
-
-        return (
-            user.is_authenticated
-            and user.shopping_cart.filter(recipe=obj).exists()
-        )
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        request = self.context.get('request')
+        return get_user_flags(request).is_in_shopping_cart(obj.id)
 
 
 class IngredientInRecipeWriteSerializer(ModelSerializer):
@@ -109,7 +172,7 @@ class RecipeWriteSerializer(ModelSerializer):
     """
     Сериализатор для создания и обновления рецепта.
     """
-    tags = PrimaryKeyRelatedField(
+    tags = TagPrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True)
     author = CustomUserSerializer(read_only=True)
     ingredients = IngredientInRecipeWriteSerializer(many=True)
@@ -131,29 +194,36 @@ class RecipeWriteSerializer(ModelSerializer):
     def validate_ingredients(self, value):
         """
         Проверяет валидность списка ингредиентов.
+
+        Все id ингредиентов проверяются одним запросом, ошибки
+        по повторам, отсутствующим ингредиентам и количеству
+        возвращаются вместе: сообщения в detail, а повторяющиеся
+        и не найденные id списками в duplicates и missing.
         """
-        ingredients = value
-        ingredients_list = []
+        counts = Counter(item['id'] for item in value)
+        existing = Ingredient.objects.in_bulk(counts.keys())
         errors = []
 
-        for item in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=item['id'])
-            if ingredient in ingredients_list:
-                errors.append({
-                    'ingredients': ['Ингредиенты не должны повторяться!']
-                })
+        duplicates = sorted(
+            ingredient_id for ingredient_id, count in counts.items()
+            if count > 1
+        )
+        if duplicates:
+            errors.append('Ингредиенты не должны повторяться!')
 
-            if int(item['amount']) < INGREDIENT_MIN_AMOUNT:
-                errors.append({
-                    'ingredients': [
-                        'Убедитесь, что это значение больше либо равно 1.'
-                    ]
-                })
+        missing = sorted(counts.keys() - existing.keys())
+        if missing:
+            errors.append('Ингредиенты не найдены.')
 
-            ingredients_list.append(ingredient)
+        if any(int(item['amount']) < INGREDIENT_MIN_AMOUNT for item in value):
+            errors.append('Убедитесь, что это значение больше либо равно 1.')
 
         if errors:
-            raise ValidationError(errors)
+            raise ValidationError({
+                'detail': errors,
+                'duplicates': duplicates,
+                'missing': missing,
+            })
 
         return value
 
@@ -195,7 +265,7 @@ class RecipeWriteSerializer(ModelSerializer):
         """
         IngredientInRecipe.objects.bulk_create(
             [IngredientInRecipe(
-                ingredient=Ingredient.objects.get(id=ingredient['id']),
+                ingredient_id=ingredient['id'],
                 recipe=recipe,
                 amount=ingredient['amount']
             ) for ingredient in ingredients]
@@ -207,26 +277,87 @@ class RecipeWriteSerializer(ModelSerializer):
         """
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        self.create_ingredients_amounts(recipe=recipe, ingredients=ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            self.create_ingredients_amounts(
+                recipe=recipe, ingredients=ingredients)
         return recipe
 
+    def update_ingredients_amounts(self, ingredients, recipe):
+        """
+        Приводит ингредиенты рецепта к переданному списку, изменяя
+        только добавленные, удаленные и изменившиеся записи.
+
+        Возвращает прежние количества по id ингредиента.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in recipe.ingredientinrecipes.all()
+        }
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in current.items()
+        }
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = current.keys() - new_amounts.keys()
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+
+        if removed:
+            recipe.ingredientinrecipes.filter(
+                ingredient_id__in=removed).delete()
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ('amount',))
+        self.create_ingredients_amounts(
+            recipe=recipe,
+            ingredients=[
+                ingredient for ingredient in ingredients
+                if ingredient['id'] not in current
+            ]
+        )
+        return old_amounts
+
     def update(self, instance, validated_data):
         """
         Обновляет существующий рецепт.
         """
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients_amounts(
-            recipe=instance, ingredients=ingredients)
-        instance.save()
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            instance.tags.set(tags)
+            old_amounts = self.update_ingredients_amounts(
+                recipe=instance, ingredients=ingredients)
+            self.update_shopping_lists(instance, old_amounts, ingredients)
         return instance
 
+    def update_shopping_lists(self, recipe, old_amounts, ingredients):
+        """
+        Переносит изменения ингредиентов рецепта в списки покупок
+        пользователей, у которых он лежит в корзине.
+        """
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        ShoppingListItem.objects.apply_deltas(
+            recipe.shopping_cart.values_list('user_id', flat=True),
+            {
+                ingredient_id: (
+                    new_amounts.get(ingredient_id, 0)
+                    - old_amounts.get(ingredient_id, 0)
+                )
+                for ingredient_id in old_amounts.keys() | new_amounts.keys()
+            }
+        )
+
     def to_representation(self, instance):
         """
         Преобразует объект рецепта в словарь для сериализации.
@@ -236,11 +367,12 @@ class RecipeWriteSerializer(ModelSerializer):
         return RecipeReadSerializer(instance, context=context).data
 
 
-class RecipeShortSerializer(ModelSerializer):
+class RecipeShortSerializer(CompiledReadMixin, ModelSerializer):
     """
     Сериализатор для краткого представления рецепта.
     """
-    image = Base64ImageField()
+    image = ImageField(read_only=True)
+    images = SerializerMethodField(method_name='get_images')
 
     class Meta:
         model = Recipe
@@ -248,5 +380,63 @@ class RecipeShortSerializer(ModelSerializer):
             'id',
             'name',
             'image',
+            'images',
             'cooking_time'
         )
+
+    def get_images(self, obj):
+        """
+        Возвращает адреса уменьшенных копий изображения.
+        """
+        return get_variant_urls(obj, self.context.get('request'))
+
+
+class BatchSerializer(Serializer):
+    """
+    Сериализатор пакетного изменения: списки id для добавления и удаления.
+    """
+    add = ListField(
+        child=IntegerField(min_value=1),
+        max_length=BATCH_MAX_SIZE,
+        default=list
+    )
+    remove = ListField(
+        child=IntegerField(min_value=1),
+        max_length=BATCH_MAX_SIZE,
+        default=list
+    )
+
+    def validate(self, data):
+        """
+        Убирает повторы и запрещает одновременно добавлять и удалять id.
+        """
+        data['add'] = list(dict.fromkeys(data['add']))
+        data['remove'] = list(dict.fromkeys(data['remove']))
+        both = sorted(set(data['add']) & set(data['remove']))
+        if both:
+            raise ValidationError(
+                f'id не могут быть одновременно в add и remove: {both}.')
+        return data
+
+    @staticmethod
+    def results(data, existing, added, removed, invalid=()):
+        """
+        Собирает результат по каждому id запроса.
+        """
+        results = []
+        for action, ids, done, done_status, skip_status in (
+            ('add', data['add'], added, 'added', 'exists'),
+            ('remove', data['remove'], removed, 'removed', 'absent'),
+        ):
+            for pk in ids:
+                if pk not in existing:
+                    item_status = 'not_found'
+                elif pk in invalid:
+                    item_status = 'invalid'
+                elif pk in done:
+                    item_status = done_status
+                else:
+                    item_status = skip_status
+                results.append(
+                    {'id': pk, 'action': action, 'status': item_status})
+        return {'results': results}
@@ -0,0 +1,75 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_token
+from api.cache import bump_generation
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+
+UserModel = get_user_model()
+
+
+def bump_on_commit(*scopes):
+    transaction.on_commit(partial(bump_generation, *scopes))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipes(**kwargs):
+    """
+    Сбрасывает кэш рецептов при изменении рецепта или его состава.
+    """
+    bump_on_commit('recipes')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    """
+    Сбрасывает кэш тегов и рецептов, в которые теги вложены.
+    """
+    bump_on_commit('tags', 'recipes')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    """
+    Сбрасывает кэш ингредиентов и рецептов, в которые они вложены.
+    """
+    bump_on_commit('ingredients', 'recipes')
+
+
+@receiver(post_save, sender=UserModel)
+def invalidate_authors(update_fields=None, **kwargs):
+    """
+    Сбрасывает кэш рецептов при изменении данных автора.
+    """
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_on_commit('recipes')
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(instance, **kwargs):
+    """
+    Убирает из кэша аутентификации удаленный токен, в том числе
+    при выходе через token/logout.
+    """
+    transaction.on_commit(partial(invalidate_token, instance.key))
+
+
+@receiver(post_save, sender=UserModel)
+def forget_user_tokens(instance, update_fields=None, **kwargs):
+    """
+    Убирает из кэша аутентификации токены измененного пользователя,
+    чтобы деактивация и правка профиля действовали сразу.
+    """
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    for key in Token.objects.filter(user=instance).values_list(
+            'key', flat=True):
+        transaction.on_commit(partial(invalidate_token, key))
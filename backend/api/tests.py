@@ -0,0 +1,84 @@
+from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from api.pagination import KeysetPagination
+from api.serializers import RecipeWriteSerializer
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+
+class KeysetPaginationTest(TestCase):
+    """
+    Проход курсором по сортировке с длинной серией одинаковых значений.
+    """
+
+    tied = KeysetPagination.offset_cutoff + 200
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Автор', last_name='Рецептов', password='password')
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f'Рецепт {number}',
+                text='Описание',
+                image='recipes/recipe.png',
+                favorites_count=number if number < 300 else 0,
+            )
+            for number in range(cls.tied + 300)
+        )
+
+    def walk(self, url):
+        client = APIClient()
+        ids = []
+        pages = 0
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+            pages += 1
+            self.assertLessEqual(pages, Recipe.objects.count())
+        return ids
+
+    def test_popular_cursor_visits_every_recipe_once(self):
+        ids = self.walk('/api/recipes/?ordering=popular&limit=100&cursor=')
+        expected = list(Recipe.objects.popular().values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link_returns_to_previous_page(self):
+        client = APIClient()
+        url = '/api/recipes/?ordering=popular&limit=100&cursor='
+        pages = []
+        for _ in range(5):
+            response = client.get(url)
+            pages.append([recipe['id'] for recipe in response.data['results']])
+            url = response.data['next']
+        response = client.get(response.data['previous'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']], pages[-2])
+
+
+class ValidateIngredientsTest(TestCase):
+    """
+    Ошибки списка ингредиентов с id повторов и отсутствующих записей.
+    """
+
+    def test_duplicates_and_missing_are_listed_by_id(self):
+        ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г')
+        missing = ingredient.id + 1
+        serializer = RecipeWriteSerializer()
+        with self.assertRaises(ValidationError) as raised:
+            serializer.validate_ingredients([
+                {'id': ingredient.id, 'amount': 1},
+                {'id': ingredient.id, 'amount': 2},
+                {'id': missing, 'amount': 3},
+            ])
+        detail = raised.exception.detail
+        self.assertEqual(detail['duplicates'], [str(ingredient.id)])
+        self.assertEqual(detail['missing'], [str(missing)])
+        self.assertEqual(len(detail['detail']), 2)
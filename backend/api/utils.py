@@ -1,40 +1,312 @@
+import csv
 from datetime import datetime
-from django.http import HttpResponse
-from django.db.models import Sum
+from io import BytesIO
 
-from foodgram.constants import CONTENT_TYPE, FILENAME
-from recipes.models import IngredientInRecipe
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+
+from foodgram.constants import SHOPPING_CART_CHUNK_SIZE, SHOPPING_CART_FORMATS
+from recipes.models import ShoppingListItem
+
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 11
+PDF_LEADING = 16
+PDF_MARGIN = 50
+RETURNING_VENDORS = ('postgresql', 'sqlite')
+
+
+class Echo:
+    """
+    Псевдобуфер, который возвращает записанную строку вместо хранения.
+    """
+    def write(self, value):
+        return value
+
+
+def insert_ignoring_conflicts(connection, model, instances, returning):
+    """
+    Вставляет instances одним INSERT ... ON CONFLICT DO NOTHING
+    и возвращает значения колонок returning для созданных строк.
+    """
+    quote = connection.ops.quote_name
+    fields = [
+        field for field in model._meta.concrete_fields
+        if field is not model._meta.pk
+    ]
+    params = []
+    for instance in instances:
+        params.extend(
+            field.get_db_prep_save(
+                field.pre_save(instance, add=True), connection=connection)
+            for field in fields
+        )
+    row_placeholder = f'({", ".join(["%s"] * len(fields))})'
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} '
+        f'({", ".join(quote(field.column) for field in fields)}) '
+        f'VALUES {", ".join([row_placeholder] * len(instances))} '
+        f'ON CONFLICT DO NOTHING '
+        f'RETURNING {", ".join(quote(column) for column in returning)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def insert_ignore(model, **values):
+    """
+    Создает запись model одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает созданный объект или None, если запись нарушает
+    ограничение уникальности (например, уже добавлена параллельным
+    запросом). post_save отправляется так же, как при create().
+    """
+    instance = model(**values)
+    alias = router.db_for_write(model, instance=instance)
+    connection = connections[alias]
+    if connection.vendor not in RETURNING_VENDORS:
+        try:
+            with transaction.atomic(using=alias):
+                instance.save(force_insert=True, using=alias)
+        except IntegrityError:
+            return None
+        return instance
+
+    rows = insert_ignoring_conflicts(
+        connection, model, [instance], (model._meta.pk.column,))
+    if not rows:
+        return None
+    instance.pk = rows[0][0]
+    instance._state.adding = False
+    instance._state.db = alias
+    post_save.send(
+        sender=model, instance=instance, created=True,
+        update_fields=None, raw=False, using=alias,
+    )
+    return instance
+
+
+def delete_returning(model, **filters):
+    """
+    Удаляет записи model с полями, равными filters, одним
+    DELETE ... RETURNING и возвращает количество удаленных строк.
+
+    post_delete отправляется только для строк, удаленных этим запросом:
+    QuerySet.delete() отправляет его для всех выбранных строк, даже если
+    параллельный запрос уже удалил их, и счетчики уменьшались дважды.
+    """
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+    if connection.vendor not in RETURNING_VENDORS:
+        with transaction.atomic(using=alias):
+            pks = list(
+                model.objects.using(alias).select_for_update()
+                .filter(**filters).values_list('pk', flat=True)
+            )
+            deleted, _ = model.objects.using(alias).filter(
+                pk__in=pks).delete()
+        return deleted
+
+    quote = connection.ops.quote_name
+    fields = model._meta.concrete_fields
+    conditions = []
+    params = []
+    for name, value in filters.items():
+        field = model._meta.get_field(name)
+        conditions.append(f'{quote(field.column)} = %s')
+        params.append(field.get_db_prep_value(value, connection))
+    sql = (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {" AND ".join(conditions)} '
+        f'RETURNING {", ".join(quote(field.column) for field in fields)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    field_names = [field.attname for field in fields]
+    for row in rows:
+        instance = model.from_db(alias, field_names, row)
+        post_delete.send(sender=model, instance=instance, using=alias)
+    return len(rows)
+
+
+def bulk_insert_ignore(model, instances, key):
+    """
+    Создает записи одним INSERT ... ON CONFLICT DO NOTHING и возвращает
+    множество значений поля key у созданных строк.
+
+    Как и bulk_create, сигналы не отправляет: счетчики и прочие
+    зависимые данные вызывающий код обновляет сам. На базах без
+    RETURNING записи вставляются по одной в точках сохранения,
+    и нарушившие уникальность пропускаются.
+    """
+    if not instances:
+        return set()
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+    field = model._meta.get_field(key)
+    if connection.vendor not in RETURNING_VENDORS:
+        created = set()
+        for instance in instances:
+            try:
+                with transaction.atomic(using=alias):
+                    model.objects.using(alias).bulk_create([instance])
+            except IntegrityError:
+                continue
+            created.add(getattr(instance, field.attname))
+        return created
+
+    return {
+        value for value, in insert_ignoring_conflicts(
+            connection, model, instances, (field.column,))
+    }
+
+
+def bulk_delete(model, key, values, **filters):
+    """
+    Удаляет записи с key из values, подходящие под filters, одним
+    DELETE ... RETURNING и возвращает множество удаленных значений key.
+
+    Сигналы не отправляются. На базах без RETURNING удаляемые строки
+    сначала блокируются SELECT ... FOR UPDATE, и DELETE удаляет ровно их.
+    """
+    if not values:
+        return set()
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+    quote = connection.ops.quote_name
+    conditions = [
+        f'{quote(model._meta.get_field(name).column)} = %s'
+        for name in filters
+    ]
+    field = model._meta.get_field(key)
+    column = quote(field.column)
+    values = list(values)
+    conditions.append(f'{column} IN ({", ".join(["%s"] * len(values))})')
+    sql = (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {" AND ".join(conditions)}'
+    )
+    params = [*filters.values(), *values]
+    if connection.vendor not in RETURNING_VENDORS:
+        with transaction.atomic(using=alias):
+            deleted = set(
+                model.objects.using(alias).select_for_update()
+                .filter(**filters, **{f'{field.attname}__in': values})
+                .values_list(field.attname, flat=True)
+            )
+            if deleted:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+        return deleted
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING {column}', params)
+        return {value for value, in cursor.fetchall()}
 
 
 def generate_shopping_cart_content(user):
     """
     Генерирует содержимое списка покупок для корзины пользователя.
     """
-    ingredients = IngredientInRecipe.objects.filter(
-        recipe__shopping_cart__user=user).values(
-            'ingredient__name', 'ingredient__measurement_unit').annotate(
-                amount=Sum('amount')
-    )
+    ingredients = ShoppingListItem.objects.filter(user=user).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        amount=F('total_amount')
+    ).order_by('ingredient__name')
     return ingredients
 
 
-def create_shopping_cart_response(user):
+def shopping_cart_lines(user, ingredients):
     """
-    Создает HTTP-ответ с содержимым списка покупок для корзины пользователя.
+    Построчно формирует текст списка покупок.
     """
-    ingredients = generate_shopping_cart_content(user)
     today = datetime.today()
-    content = (
-        f'Foodgram. {today:%Y.%m.%d, %H:%M}\n'
-        f'Список покупок для: {user.get_full_name()}\n\n'
+    yield f'Foodgram. {today:%Y.%m.%d, %H:%M}'
+    yield f'Список покупок для: {user.get_full_name()}'
+    yield ''
+    for ingredient in ingredients:
+        yield (
+            f'- {ingredient["ingredient__name"]}, '
+            f'{ingredient["ingredient__measurement_unit"]}: '
+            f'{ingredient["amount"]}'
+        )
+
+
+def write_txt(user, ingredients):
+    """
+    Отдает список покупок текстом по одной строке.
+    """
+    for index, line in enumerate(shopping_cart_lines(user, ingredients)):
+        yield f'\n{line}' if index else line
+
+
+def write_csv(user, ingredients):
+    """
+    Отдает список покупок в формате CSV по одной строке.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['amount'],
+        ))
+
+
+def write_pdf(user, ingredients):
+    """
+    Отдает список покупок в формате PDF.
+
+    Таблица ссылок PDF записывается в конце файла, поэтому документ
+    собирается целиком и отдается одним фрагментом.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen.canvas import Canvas
+
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT))
+    buffer = BytesIO()
+    canvas = Canvas(buffer, pagesize=A4)
+    width, height = A4
+    top = height - PDF_MARGIN
+    y = top
+    canvas.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+    for line in shopping_cart_lines(user, ingredients):
+        if y < PDF_MARGIN:
+            canvas.showPage()
+            canvas.setFont(PDF_FONT_NAME, PDF_FONT_SIZE)
+            y = top
+        canvas.drawString(PDF_MARGIN, y, line)
+        y -= PDF_LEADING
+    canvas.save()
+    yield buffer.getvalue()
+
+
+SHOPPING_CART_WRITERS = {
+    'txt': write_txt,
+    'csv': write_csv,
+    'pdf': write_pdf,
+}
+
+
+def create_shopping_cart_response(user, file_format='txt'):
+    """
+    Создает потоковый HTTP-ответ со списком покупок в выбранном формате.
+    """
+    ingredients = generate_shopping_cart_content(user).iterator(
+        chunk_size=SHOPPING_CART_CHUNK_SIZE)
+    content_type, filename = SHOPPING_CART_FORMATS[file_format]
+    response = StreamingHttpResponse(
+        SHOPPING_CART_WRITERS[file_format](user, ingredients),
+        content_type=content_type
     )
-    content += '\n'.join([
-        f'- {ingredient["ingredient__name"]}, '
-        f'{ingredient["ingredient__measurement_unit"]}: '
-        f'{ingredient["amount"]}'
-        for ingredient in ingredients
-    ])
-
-    response = HttpResponse(content, content_type=CONTENT_TYPE)
-    response['Content-Disposition'] = f'attachment; filename={FILENAME}'
+    response['Content-Disposition'] = f'attachment; filename={filename}'
     return response
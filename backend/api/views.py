@@ -1,3 +1,9 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from django.utils.http import quote_etag
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 
@@ -5,45 +11,136 @@ from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.status import HTTP_400_BAD_REQUEST
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from foodgram.replicas import ReplicaReadMixin
+from recipes.autocomplete import ingredient_catalog
+from recipes.counters import adjust_counter
 from recipes.models import (
     Favorite,
     Ingredient,
     Recipe,
     ShoppingCart,
+    ShoppingListItem,
     Tag
 )
+from recipes.registry import tag_registry
+from api.cache import ResponseCacheMixin
+from api.flags import UserFlags, get_user_flags
 from api.filters import IngredientFilter, RecipeFilter
 from api.pagination import CustomPagination
 from api.permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
+from api.renderers import (
+    CSVRenderer,
+    PDFRenderer,
+    PlainTextRenderer,
+    ShoppingListNegotiation
+)
 from api.serializers import (
+    BatchSerializer,
     IngredientSerializer,
     RecipeReadSerializer,
     RecipeShortSerializer,
     RecipeWriteSerializer,
     TagSerializer
 )
-from .utils import create_shopping_cart_response
+from .utils import (
+    bulk_delete,
+    bulk_insert_ignore,
+    create_shopping_cart_response,
+    delete_returning,
+    insert_ignore
+)
+
+BATCH_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, ResponseCacheMixin, ModelViewSet):
     """
     ViewSet для работы с рецептами.
     """
+    cache_scopes = ('recipes',)
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def is_response_cacheable(self, request):
+        """
+        Выборки, отфильтрованные по избранному и корзине, у каждого
+        пользователя свои и в общий кэш не попадают.
+        """
+        return super().is_response_cacheable(request) and not (
+            request.user.is_authenticated
+            and any(
+                request.query_params.get(param) not in (None, '', '0')
+                for param in ('is_favorited', 'is_in_shopping_cart')
+            )
+        )
+
+    def get_cache_scopes(self):
+        if self.action == 'trending':
+            return self.cache_scopes + ('trending',)
+        return self.cache_scopes
+
+    def get_response_etag(self, request, key):
+        digest = get_user_flags(request).digest
+        return quote_etag(md5(f'{key}:{digest}'.encode()).hexdigest())
+
+    def personalize_response_data(self, request, data):
+        """
+        Проставляет в общий ответ флаги избранного, корзины и подписки
+        текущего пользователя.
+        """
+        flags = get_user_flags(request)
+        recipes = data['results'] if 'results' in data else [data]
+        for recipe in recipes:
+            flags.overlay_recipe(recipe)
+        return data
+
+    def get_queryset(self):
+        if self.request.method in SAFE_METHODS:
+            return Recipe.objects.for_feed(self.request.user)
+        return super().get_queryset()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """
+        Ошибки скачивания списка покупок отдаются в JSON, как в остальном
+        API, а не в формате запрошенного файла.
+        """
+        if (
+            self.action == 'download_shopping_cart'
+            and isinstance(response, Response)
+            and response.status_code >= 400
+        ):
+            renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+            request.accepted_renderer = renderer
+            request.accepted_media_type = renderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
     def perform_create(self, serializer):
         """
         Создать новый рецепт.
         """
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        """
+        Удалить рецепт и вычесть его из списков покупок.
+        """
+        with transaction.atomic():
+            ShoppingListItem.objects.remove_recipes(
+                instance.shopping_cart.values_list('user_id', flat=True),
+                [instance.id]
+            )
+            instance.delete()
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
@@ -75,15 +172,50 @@ class RecipeViewSet(ModelViewSet):
             return self.add_to(ShoppingCart, request.user, pk)
         return self.delete_from(ShoppingCart, request.user, pk)
 
+    @action(
+        detail=False,
+        methods=('post',),
+        permission_classes=(IsAuthenticated,),
+        url_path='favorite/batch'
+    )
+    def favorite_batch(self, request):
+        """
+        Пакетное добавление рецептов в избранное и удаление из него.
+        """
+        return self.batch_update(Favorite, request)
+
+    @action(
+        detail=False,
+        methods=('post',),
+        permission_classes=(IsAuthenticated,),
+        url_path='shopping_cart/batch'
+    )
+    def shopping_cart_batch(self, request):
+        """
+        Пакетное добавление рецептов в корзину и удаление из нее.
+        """
+        return self.batch_update(ShoppingCart, request)
+
     def add_to(self, model, user, pk):
         """
         Вспомогательная функция для добавления объекта в модель.
+
+        Повторное добавление, в том числе параллельное, отсекается
+        ограничением уникальности в том же INSERT.
         """
-        if model.objects.filter(user=user, recipe__id=pk).exists():
+        recipe = get_object_or_404(
+            Recipe.objects.only(
+                'id', 'name', 'image', 'image_variants', 'cooking_time'),
+            id=pk
+        )
+        with transaction.atomic():
+            created = insert_ignore(model, user=user, recipe=recipe)
+            if created and model is ShoppingCart:
+                ShoppingListItem.objects.add_recipes([user.id], [recipe.id])
+        if not created:
             return Response({'errors': 'Рецепт уже добавлен!'},
                             status=status.HTTP_400_BAD_REQUEST)
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        UserFlags.invalidate(user.id)
         serializer = RecipeShortSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -91,43 +223,131 @@ class RecipeViewSet(ModelViewSet):
         """
         Вспомогательная функция для удаления объекта из модели.
         """
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response({'errors': 'Рецепт уже удален!'},
-                        status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            deleted = delete_returning(model, user_id=user.id, recipe_id=pk)
+            if deleted and model is ShoppingCart:
+                ShoppingListItem.objects.remove_recipes([user.id], [pk])
+        if not deleted:
+            return Response({'errors': 'Рецепт уже удален!'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        UserFlags.invalidate(user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def batch_update(self, model, request):
+        """
+        Применяет списки add и remove одной транзакцией: существование
+        рецептов проверяется одним запросом, вставка и удаление -
+        по одному запросу на список.
+        """
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        user = request.user
+        existing = set(Recipe.objects.filter(
+            id__in=data['add'] + data['remove']
+        ).values_list('id', flat=True))
+        counter = BATCH_COUNTERS[model]
+
+        with transaction.atomic():
+            added = bulk_insert_ignore(
+                model,
+                [
+                    model(user=user, recipe_id=pk)
+                    for pk in data['add'] if pk in existing
+                ],
+                key='recipe_id'
+            )
+            removed = bulk_delete(
+                model, 'recipe_id',
+                [pk for pk in data['remove'] if pk in existing],
+                user_id=user.id
+            )
+            adjust_counter(Recipe, counter, added, 1)
+            adjust_counter(Recipe, counter, removed, -1)
+            if model is ShoppingCart:
+                ShoppingListItem.objects.add_recipes([user.id], added)
+                ShoppingListItem.objects.remove_recipes([user.id], removed)
+        if added or removed:
+            UserFlags.invalidate(user.id)
+        return Response(
+            BatchSerializer.results(data, existing, added, removed))
+
+    @action(detail=False)
+    def trending(self, request):
+        """
+        Рецепты, набирающие популярность, по рейтингу из refresh_trending.
+        """
+        return self.get_cached_response(request, self.list_trending)
+
+    def list_trending(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).trending()
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         detail=False,
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer, PDFRenderer),
+        content_negotiation_class=ShoppingListNegotiation
     )
     def download_shopping_cart(self, request):
         """
-        Скачать список покупок для корзины пользователя.
+        Скачать список покупок для корзины пользователя
+        в формате txt, csv или pdf (параметр format).
         """
         user = request.user
         if not user.shopping_cart.exists():
             return Response(status=HTTP_400_BAD_REQUEST)
 
-        return create_shopping_cart_response(user)
+        return create_shopping_cart_response(
+            user, request.accepted_renderer.format)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(
+        ReplicaReadMixin, ResponseCacheMixin, ReadOnlyModelViewSet):
     """
     ViewSet для работы с ингредиентами.
     """
+    cache_scopes = ('ingredients',)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        """
+        Подсказки по названию ингредиента из индекса в памяти процесса.
+        """
+        name = request.query_params.get('name')
+        if name and settings.INGREDIENT_AUTOCOMPLETE_IN_MEMORY:
+            return Response(ingredient_catalog.search(name))
+        return super().list(request, *args, **kwargs)
+
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(
+        ReplicaReadMixin, ResponseCacheMixin, ReadOnlyModelViewSet):
     """
     ViewSet для работы с тегами.
     """
+    cache_scopes = ('tags',)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
+
+    def get_queryset(self):
+        return tag_registry.all()
+
+    def get_object(self):
+        """
+        Ищет тег в реестре тегов, не обращаясь к базе.
+        """
+        try:
+            tag = tag_registry.get(int(self.kwargs['pk']))
+        except (TypeError, ValueError):
+            tag = None
+        if tag is None:
+            raise Http404
+        self.check_object_permissions(self.request, tag)
+        return tag
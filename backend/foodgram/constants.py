@@ -2,5 +2,34 @@ COOKING_TIME_MIN_VALUE = 1
 COOKING_TIME_DEFAULT_VALUE = 1
 INGREDIENT_MIN_AMOUNT = 1
 INGREDIENT_DEFAULT_AMOUNT = 1
-CONTENT_TYPE = 'text/plain'
-FILENAME = 'shopping_list.txt'
+SHOPPING_CART_FORMATS = {
+    'txt': ('text/plain', 'shopping_list.txt'),
+    'csv': ('text/csv', 'shopping_list.csv'),
+    'pdf': ('application/pdf', 'shopping_list.pdf'),
+}
+SHOPPING_CART_CHUNK_SIZE = 500
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_CATALOG_TIMEOUT = 30
+TAG_REGISTRY_TIMEOUT = 30
+RECIPE_SEARCH_CONFIG = 'russian'
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+RESPONSE_CACHE_TIMEOUT = 300
+USER_FLAGS_CACHE_TIMEOUT = 600
+TOKEN_CACHE_TIMEOUT = 300
+TOKEN_CACHE_LOCAL_TIMEOUT = 30
+TOKEN_CACHE_SIZE = 10000
+IMAGE_VARIANTS = {
+    'thumbnail': (320, 320),
+    'medium': (800, 800),
+}
+IMAGE_VARIANT_FORMAT = ('WEBP', 'webp')
+IMAGE_VARIANT_QUALITY = 80
+TRENDING_HALF_LIFE_HOURS = 72
+TRENDING_WINDOW_DAYS = 30
+TRENDING_WEIGHTS = {
+    'favorite': 1.0,
+    'shopping_cart': 0.5,
+}
+TRENDING_MIN_SCORE = 0.01
+TRENDING_REFRESH_INTERVAL = 300
+BATCH_MAX_SIZE = 500
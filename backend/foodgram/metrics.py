@@ -0,0 +1,265 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+METRICS = (
+    ('requests_total', 'counter', 'Количество запросов.'),
+    ('request_seconds_total', 'counter', 'Суммарное время запросов, с.'),
+    ('db_queries_total', 'counter', 'Количество SQL-запросов.'),
+    ('db_duplicate_queries_total', 'counter',
+     'SQL-запросы, повторяющие уже выполненный в том же запросе шаблон.'),
+    ('db_seconds_total', 'counter', 'Суммарное время SQL-запросов, с.'),
+    ('serialize_seconds_total', 'counter',
+     'Суммарное время сериализации без SQL-запросов, с.'),
+    ('render_seconds_total', 'counter',
+     'Суммарное время рендеринга ответа в JSON или шаблон, с.'),
+    ('query_budget_exceeded_total', 'counter',
+     'Запросы, превысившие бюджет SQL-запросов.'),
+    ('db_queries_max', 'gauge', 'Максимум SQL-запросов на один запрос.'),
+)
+# Счетчики вне представлений: (имя, метка, описание).
+LABELED_COUNTERS = (
+    ('token_cache_lookups_total', 'result',
+     'Проверки токенов: local и shared - попадания в кэш процесса и '
+     'общий кэш, database - обращения к базе.'),
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Представление выполнило больше SQL-запросов, чем разрешено
+    в QUERY_BUDGETS.
+    """
+
+
+class MetricsRegistry:
+    """
+    Накопленные метрики по представлениям в памяти процесса.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(lambda: defaultdict(float))
+        self._counters = defaultdict(Counter)
+
+    def record(self, view, stats, exceeded):
+        with self._lock:
+            values = self._values[view]
+            values['requests_total'] += 1
+            values['request_seconds_total'] += stats.total
+            values['db_queries_total'] += stats.queries
+            values['db_duplicate_queries_total'] += stats.duplicates
+            values['db_seconds_total'] += stats.db_time
+            values['serialize_seconds_total'] += stats.serialize_time
+            values['render_seconds_total'] += stats.render_time
+            values['query_budget_exceeded_total'] += exceeded
+            values['db_queries_max'] = max(
+                values['db_queries_max'], stats.queries)
+
+    def increment(self, name, label, amount=1):
+        with self._lock:
+            self._counters[name][label] += amount
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+            self._counters.clear()
+
+    def export(self):
+        """
+        Возвращает метрики в текстовом формате Prometheus.
+        """
+        with self._lock:
+            snapshot = {
+                view: dict(values) for view, values in self._values.items()
+            }
+            counters = {
+                name: dict(values) for name, values in self._counters.items()
+            }
+        lines = []
+        for name, kind, description in METRICS:
+            metric = f'foodgram_{name}'
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for view, values in sorted(snapshot.items()):
+                label = view.replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(
+                    f'{metric}{{view="{label}"}} {values.get(name, 0):g}')
+        for name, label, description in LABELED_COUNTERS:
+            metric = f'foodgram_{name}'
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} counter')
+            for value, count in sorted(counters.get(name, {}).items()):
+                lines.append(f'{metric}{{{label}="{value}"}} {count:g}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class RequestStats:
+    """
+    SQL-запросы и время одного HTTP-запроса.
+
+    Используется как обертка connection.execute_wrapper.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.serializing = False
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.fingerprints[sql] += 1
+
+    def measure_serialization(self, represent, instance):
+        """
+        Вызывает represent(instance) и добавляет время к serialize_time.
+
+        Вложенные сериализаторы выполняются внутри внешнего и отдельно
+        не считаются; время SQL-запросов, сделанных при сериализации,
+        остается в db_time.
+        """
+        if self.serializing:
+            return represent(instance)
+        self.serializing = True
+        started = time.perf_counter()
+        db_started = self.db_time
+        try:
+            return represent(instance)
+        finally:
+            self.serialize_time += (
+                time.perf_counter() - started - (self.db_time - db_started))
+            self.serializing = False
+
+    @property
+    def queries(self):
+        return sum(self.fingerprints.values())
+
+    @property
+    def duplicates(self):
+        return self.queries - len(self.fingerprints)
+
+    def server_timing(self):
+        app_time = (
+            self.total - self.db_time - self.serialize_time
+            - self.render_time)
+        return ', '.join((
+            f'db;desc="{self.queries} queries, '
+            f'{self.duplicates} duplicates";dur={self.db_time * 1000:.1f}',
+            f'app;dur={app_time * 1000:.1f}',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+
+class QueryMetricsMiddleware:
+    """
+    Считает SQL-запросы, их повторы, время базы, сериализации
+    и рендеринга по представлениям, отдает их в заголовке Server-Timing
+    и сверяет количество запросов на чтение с бюджетом из QUERY_BUDGETS.
+
+    Превышение бюджета пишется в лог, а при QUERY_BUDGET_STRICT
+    поднимает QueryBudgetExceeded, чтобы тесты падали.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        request._query_stats = stats
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        stats.total = time.perf_counter() - stats.started
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        exceeded = (
+            request.method in SAFE_METHODS and self.check_budget(view, stats)
+        )
+        registry.record(view, stats, exceeded)
+        if settings.SERVER_TIMING_ENABLED:
+            response['Server-Timing'] = stats.server_timing()
+        return response
+
+    def process_template_response(self, request, response):
+        """
+        Засекает время рендеринга ответов DRF и шаблонов.
+
+        Рендеринг только кодирует готовые данные: serializer.data
+        вычисляется в представлении, и его время считает
+        RequestStats.measure_serialization.
+        """
+        stats = getattr(request, '_query_stats', None)
+        if stats is not None:
+            started = time.perf_counter()
+
+            def finish(rendered):
+                stats.render_time += time.perf_counter() - started
+
+            response.add_post_render_callback(finish)
+        return response
+
+    def check_budget(self, view, stats):
+        budget = settings.QUERY_BUDGETS.get(view)
+        if budget is None or stats.queries <= budget:
+            return False
+        repeated = [
+            f'{count}x {sql[:200]}'
+            for sql, count in stats.fingerprints.most_common(3) if count > 1
+        ]
+        message = (
+            f'{view}: {stats.queries} SQL-запросов при бюджете {budget}. '
+            f'Повторы: {repeated}'
+        )
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+        return True
+
+
+def metrics_view(request):
+    """
+    Метрики в формате Prometheus.
+
+    Доступны администраторам, в режиме DEBUG и по заголовку
+    Authorization: Bearer <METRICS_TOKEN>.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    allowed = (
+        settings.DEBUG
+        or request.user.is_staff
+        or (token and constant_time_compare(header, f'Bearer {token}'))
+    )
+    if not allowed:
+        raise PermissionDenied
+    return HttpResponse(
+        registry.export(), content_type='text/plain; version=0.0.4')
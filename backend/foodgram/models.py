@@ -0,0 +1,25 @@
+class CounterFieldsMixin:
+    """
+    Не записывает денормализованные счетчики при сохранении объекта.
+
+    Счетчики меняются только атомарным UPDATE с F(): полное сохранение
+    загруженного ранее объекта вернуло бы в строку устаревшие значения
+    и отменило бы параллельные изменения. Поля счетчиков перечисляются
+    в counter_fields.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
@@ -0,0 +1,116 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY = 'replica-pin:{}'
+
+_replica = ContextVar('database_replica', default=None)
+
+
+def pin_to_primary(user):
+    """
+    Направляет чтение пользователя в основную базу на
+    DB_REPLICA_PIN_SECONDS, пока реплики догоняют его запись.
+    """
+    cache.set(PIN_KEY.format(user.pk), True, settings.DB_REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    if not settings.DATABASE_REPLICAS or not user.is_authenticated:
+        return False
+    return cache.get(PIN_KEY.format(user.pk), False)
+
+
+def reading_from_replica():
+    return _replica.get() is not None
+
+
+class ReplicaRouter:
+    """
+    Отправляет чтение в реплику, выбранную для текущего запроса
+    ReplicaReadMixin, а запись, миграции и чтение внутри транзакций -
+    в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """
+    Выполняет безопасные запросы к представлению на реплике.
+
+    Пользователь, недавно изменивший данные, читает из основной базы
+    и в обход общего кэша ответов, чтобы сразу увидеть свои изменения.
+    Ответы, построенные на реплике, кэшируются не дольше
+    DB_REPLICA_CACHE_TIMEOUT: реплика могла еще не получить последние
+    записи других пользователей.
+    """
+
+    pinned = False
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.pinned = is_pinned(request.user)
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method in SAFE_METHODS
+            and not self.pinned
+        ):
+            _replica.set(random.choice(settings.DATABASE_REPLICAS))
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _replica.set(None)
+
+    def is_response_cacheable(self, request):
+        return super().is_response_cacheable(request) and not self.pinned
+
+    def get_response_cache_timeout(self):
+        timeout = super().get_response_cache_timeout()
+        if reading_from_replica():
+            return min(timeout, settings.DB_REPLICA_CACHE_TIMEOUT)
+        return timeout
+
+
+class PrimaryPinMiddleware:
+    """
+    Закрепляет пользователя за основной базой после успешного
+    изменяющего запроса.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and user is not None
+            and user.is_authenticated
+        ):
+            pin_to_primary(user)
+        return response
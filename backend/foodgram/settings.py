@@ -31,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -38,6 +39,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram.replicas.PrimaryPinMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -70,10 +72,55 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default=5432)
+        'PORT': os.getenv('DB_PORT', default=5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
     }
 }
 
+# Реплики для чтения: через запятую host[:port] для PostgreSQL
+# или пути к файлам для SQLite.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(','))):
+    if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        location = {'NAME': replica.strip()}
+    else:
+        host, _, port = replica.strip().partition(':')
+        location = {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        **location,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['foodgram.replicas.ReplicaRouter']
+
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+DB_REPLICA_CACHE_TIMEOUT = int(os.getenv('DB_REPLICA_CACHE_TIMEOUT', 30))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Кэш в памяти процесса не виден другим процессам, и сброс через него
+# не доходит до них. Кэши, которые сбрасываются при изменении данных,
+# работают, если кэш общий или процесс сервера один: gunicorn.conf.py
+# передает число процессов в GUNICORN_WORKERS, а runserver и manage.py
+# запускают один процесс.
+CACHE_IS_SHARED = CACHES['default']['BACKEND'] != (
+    'django.core.cache.backends.locmem.LocMemCache')
+SERVER_PROCESSES = int(os.getenv('GUNICORN_WORKERS', 1))
+CACHE_IS_COHERENT = CACHE_IS_SHARED or SERVER_PROCESSES == 1
+
+RESPONSE_CACHE_ALIAS = os.getenv('RESPONSE_CACHE_ALIAS', 'default')
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -110,6 +157,44 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DEFAULT_FILE_STORAGE = 'foodgram.storage.HashedMediaStorage'
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+INGREDIENT_AUTOCOMPLETE_IN_MEMORY = os.getenv(
+    'INGREDIENT_AUTOCOMPLETE_IN_MEMORY', 'True'
+).lower() == 'true'
+
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', 2))
+
+QUERY_METRICS_ENABLED = os.getenv(
+    'QUERY_METRICS_ENABLED', 'True'
+).lower() == 'true'
+
+SERVER_TIMING_ENABLED = os.getenv(
+    'SERVER_TIMING_ENABLED', str(DEBUG)
+).lower() == 'true'
+
+QUERY_BUDGET_STRICT = os.getenv(
+    'QUERY_BUDGET_STRICT', 'False'
+).lower() == 'true'
+
+QUERY_BUDGETS = {
+    'api:recipe-list': 10,
+    'api:recipe-detail': 10,
+    'api:recipe-trending': 10,
+    'api:ingredient-list': 3,
+    'api:tag-list': 3,
+    'api:recipe-download-shopping-cart': 5,
+    'users:user-list': 6,
+    'users:user-subscriptions': 8,
+}
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -119,7 +204,12 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 }
 
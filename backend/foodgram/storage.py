@@ -0,0 +1,72 @@
+import hashlib
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_LENGTH = 32
+URL_CACHE_SIZE = 10000
+HASHED_NAME_RE = re.compile(rf'^[0-9a-f]{{{HASH_LENGTH}}}(\.[0-9a-z]+)?$')
+
+
+def is_hashed_name(name):
+    """
+    Проверяет, что имя файла уже построено из хэша содержимого.
+    """
+    return bool(HASHED_NAME_RE.match(posixpath.basename(name)))
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """
+    Хранилище медиафайлов с именами из хэша содержимого.
+
+    Файл сохраняется как <каталог>/<sha256>.<расширение>, поэтому
+    по одному адресу всегда лежит одно и то же содержимое, и nginx
+    может отдавать его с неограниченным сроком кэширования.
+    Повторная загрузка того же файла не создает копию.
+
+    Адреса файлов запоминаются: при выдаче списков рецептов их
+    построение было заметной частью сериализации.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._urls = {}
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == 'MEDIA_URL':
+            self._urls = {}
+
+    def url(self, name):
+        url = self._urls.get(name)
+        if url is None:
+            url = super().url(name)
+            if len(self._urls) >= URL_CACHE_SIZE:
+                self._urls = {}
+            self._urls[name] = url
+        return url
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, digest.hexdigest()[:HASH_LENGTH] + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(self.generate_filename(name), content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
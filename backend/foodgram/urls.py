@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from foodgram.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/metrics/', metrics_view, name='metrics'),
     path('api/', include('api.urls')),
     path('api/', include('users.urls')),
 ]
@@ -0,0 +1,31 @@
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+
+# Потоки одного процесса перекрывают ожидание ответов базы; медленных
+# клиентов принимает на себя буферизующий nginx.
+worker_class = 'gthread'
+
+# Кэш в памяти процесса не виден остальным процессам: сброс кэша
+# ответов, флагов пользователей, токенов и реестров тегов и ингредиентов
+# дошел бы только до одного из них. Без общего кэша (CACHE_BACKEND)
+# по умолчанию запускается один процесс.
+LOCAL_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+shared_cache = os.getenv(
+    'CACHE_BACKEND', LOCAL_CACHE_BACKEND) != LOCAL_CACHE_BACKEND
+workers = int(os.getenv(
+    'GUNICORN_WORKERS',
+    multiprocessing.cpu_count() * 2 + 1 if shared_cache else 1))
+# Процессы наследуют окружение мастера: по числу процессов настройки
+# решают, можно ли кэшировать в памяти процесса (CACHE_IS_COHERENT).
+os.environ['GUNICORN_WORKERS'] = str(workers)
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = timeout
+
+# Перезапуск процессов ограничивает рост памяти.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
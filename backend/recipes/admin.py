@@ -4,9 +4,11 @@ from recipes.models import (
     Ingredient,
     IngredientInRecipe,
     Recipe,
+    RecipeTrend,
     Tag,
     Favorite,
-    ShoppingCart
+    ShoppingCart,
+    ShoppingListItem
 )
 
 
@@ -22,14 +24,22 @@ class RecipeAdmin(admin.ModelAdmin):
                     'name',
                     'author',
                     'favorite_count',
+                    'in_carts_count',
                     'ingredients_list')
     list_filter = ('name', 'author', 'tags')
     search_fields = ('name',)
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(
+                request, queryset, search_term)
+        return queryset.search(search_term), False
+
     def favorite_count(self, obj):
-        return obj.favorites.count()
+        return obj.favorites_count
 
     favorite_count.short_description = 'Избрано'
+    favorite_count.admin_order_field = 'favorites_count'
 
     def ingredients_list(self, obj):
         return ", ".join(
@@ -65,3 +75,15 @@ class FavoriteAdmin(admin.ModelAdmin):
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'total_amount')
+    list_select_related = ('user', 'ingredient')
+
+
+@admin.register(RecipeTrend)
+class RecipeTrendAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'score', 'updated_at')
+    list_select_related = ('recipe',)
@@ -0,0 +1,119 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from foodgram.constants import (
+    INGREDIENT_CATALOG_TIMEOUT,
+    INGREDIENT_SEARCH_LIMIT
+)
+
+VERSION_KEY = 'recipes:ingredients:version'
+
+
+def get_version(key):
+    """
+    Возвращает версию справочника из кэша.
+
+    Если счетчик пропал из кэша, он создается заново со значением
+    от текущего времени, чтобы не совпасть с версией, уже загруженной
+    каким-либо процессом.
+    """
+    version = cache.get(key)
+    if version is None:
+        initial = time.time_ns()
+        cache.add(key, initial, timeout=None)
+        version = cache.get(key, initial)
+    return version
+
+
+def bump_version(key):
+    """
+    Переводит справочник на новую версию.
+    """
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+class IngredientIndex:
+    """
+    Префиксный индекс справочника ингредиентов в памяти процесса.
+
+    Названия хранятся отсортированными в нижнем регистре, поэтому
+    совпадения по началу находятся бинарным поиском, а совпадения
+    по подстроке - проходом по небольшому справочнику.
+    """
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: row['name'].casefold())
+        self.keys = [row['name'].casefold() for row in self.rows]
+
+    def search(self, query, limit=INGREDIENT_SEARCH_LIMIT):
+        """
+        Возвращает ингредиенты, название которых начинается с query,
+        а за ними - содержащие query, не более limit записей.
+        """
+        query = query.casefold()
+        position = bisect_left(self.keys, query)
+        result = []
+        while (
+            len(result) < limit
+            and position < len(self.keys)
+            and self.keys[position].startswith(query)
+        ):
+            result.append(self.rows[position])
+            position += 1
+        if len(result) < limit:
+            for key, row in zip(self.keys, self.rows):
+                if query in key and not key.startswith(query):
+                    result.append(row)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+class IngredientCatalog:
+    """
+    Кэш индекса ингредиентов с инвалидацией по счетчику версий.
+
+    Счетчик хранится в кэше Django, так что при общем бэкенде кэша
+    изменение ингредиента сбрасывает индекс во всех процессах. Индекс
+    к тому же перечитывается раз в INGREDIENT_CATALOG_TIMEOUT секунд:
+    без общего кэша это единственный путь изменений в другие процессы.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._expires = 0
+
+    def get_index(self):
+        version = get_version(VERSION_KEY)
+        if (
+            self._index is None
+            or version != self._version
+            or self._expires < time.monotonic()
+        ):
+            from recipes.models import Ingredient
+
+            with self._lock:
+                rows = Ingredient.objects.using(DEFAULT_DB_ALIAS).values(
+                    'id', 'name', 'measurement_unit').order_by()
+                self._index = IngredientIndex(list(rows))
+                self._version = version
+                self._expires = time.monotonic() + INGREDIENT_CATALOG_TIMEOUT
+        return self._index
+
+    def search(self, query, limit=INGREDIENT_SEARCH_LIMIT):
+        return self.get_index().search(query, limit)
+
+    def invalidate(self):
+        bump_version(VERSION_KEY)
+
+
+ingredient_catalog = IngredientCatalog()
@@ -0,0 +1,50 @@
+import statistics
+import subprocess
+
+from django.conf import settings
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(values, rank):
+    """
+    Перцентиль отсортированного списка с линейной интерполяцией.
+    """
+    position = (len(values) - 1) * rank / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower)
+
+
+def summarize(timings, queries=None):
+    """
+    Перцентили, среднее и крайние значения времени в миллисекундах
+    и, если переданы, наибольшее и наименьшее количество SQL-запросов.
+    """
+    timings = sorted(timing * 1000 for timing in timings)
+    result = {
+        f'p{rank}_ms': round(percentile(timings, rank), 3)
+        for rank in PERCENTILES
+    }
+    result.update(
+        mean_ms=round(statistics.mean(timings), 3),
+        min_ms=round(timings[0], 3),
+        max_ms=round(timings[-1], 3),
+    )
+    if queries:
+        result.update(queries=max(queries), queries_min=min(queries))
+    return result
+
+
+def git_commit():
+    """
+    Короткий хэш текущего коммита или None вне репозитория.
+    """
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow
+
+UserModel = get_user_model()
+
+# (модель со счетчиком, поле счетчика, модель-источник, внешний ключ)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (UserModel, 'recipes_count', Recipe, 'author'),
+    (UserModel, 'followers_count', Follow, 'author'),
+    (UserModel, 'following_count', Follow, 'user'),
+)
+
+
+def adjust_counter(model, field, ids, delta):
+    """
+    Изменяет счетчик field у объектов ids на delta одним UPDATE.
+
+    Значение не опускается ниже нуля; расхождения исправляет
+    команда reconcile_counters.
+    """
+    ids = [pk for pk in ids if pk is not None]
+    if not ids or not delta:
+        return
+    model.objects.filter(pk__in=ids).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def actual_count(source, foreign_key):
+    """
+    Подзапрос с фактическим количеством строк source для OuterRef('pk').
+    """
+    return Coalesce(
+        Subquery(
+            source.objects.filter(**{foreign_key: OuterRef('pk')})
+            .order_by()
+            .values(foreign_key)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0),
+    )
+
+
+def reconcile(fix=True):
+    """
+    Сравнивает счетчики с фактическим количеством строк и,
+    если fix, исправляет расхождения.
+
+    Возвращает {(модель, поле): число расходящихся объектов}.
+    """
+    mismatches = {}
+    for model, field, source, foreign_key in COUNTERS:
+        stale = model.objects.annotate(
+            actual=actual_count(source, foreign_key)
+        ).exclude(**{field: F('actual')})
+        stale_ids = list(stale.values_list('pk', flat=True))
+        mismatches[model._meta.label, field] = len(stale_ids)
+        if fix and stale_ids:
+            model.objects.filter(pk__in=stale_ids).update(
+                **{field: actual_count(source, foreign_key)})
+    return mismatches
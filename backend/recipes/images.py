@@ -0,0 +1,143 @@
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image, ImageOps
+
+from foodgram.constants import (
+    IMAGE_VARIANT_FORMAT,
+    IMAGE_VARIANT_QUALITY,
+    IMAGE_VARIANTS
+)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def get_executor():
+    """
+    Возвращает общий пул потоков обработки изображений.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PIPELINE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+    return _executor
+
+
+def variant_name(name, variant):
+    """
+    Имя файла варианта рядом с оригиналом: recipes/cake_thumbnail.webp.
+
+    Хранилище с хэшированными именами использует из него только
+    каталог и расширение.
+    """
+    path = PurePosixPath(name)
+    return str(path.with_name(
+        f'{path.stem}_{variant}.{IMAGE_VARIANT_FORMAT[1]}'))
+
+
+def render_variants(source):
+    """
+    Строит уменьшенные копии изображения во всех размерах IMAGE_VARIANTS.
+    """
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        for variant, size in IMAGE_VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(
+                buffer,
+                IMAGE_VARIANT_FORMAT[0],
+                quality=IMAGE_VARIANT_QUALITY,
+            )
+            yield variant, buffer.getvalue()
+
+
+def generate_variants(recipe_id):
+    """
+    Создает варианты изображения рецепта и записывает их имена
+    в Recipe.image_variants.
+
+    Если изображение успело смениться, результат отбрасывается:
+    варианты для нового изображения построит следующая задача.
+    """
+    from api.cache import bump_generation
+    from recipes.models import Recipe
+
+    recipe = Recipe.objects.only('image', 'image_variants').filter(
+        pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    variants = {'source': source}
+    with default_storage.open(source) as file:
+        for variant, content in render_variants(file):
+            variants[variant] = default_storage.save(
+                variant_name(source, variant), ContentFile(content))
+    updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_variants=variants)
+    if updated:
+        bump_generation('recipes')
+
+
+def run_generate_variants(recipe_id):
+    try:
+        generate_variants(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение рецепта %s', recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_variants(recipe_id):
+    """
+    Ставит построение вариантов изображения в пул потоков.
+    """
+    future = get_executor().submit(run_generate_variants, recipe_id)
+    _pending.add(future)
+    future.add_done_callback(_pending.discard)
+
+
+def wait_for_variants(timeout=None):
+    """
+    Ждет завершения поставленных в пул задач.
+    """
+    wait(list(_pending), timeout=timeout)
+
+
+def get_variant_urls(recipe, request=None):
+    """
+    Возвращает адреса вариантов изображения рецепта.
+
+    Пока варианты не построены, для всех размеров отдается оригинал.
+    """
+    if not recipe.image:
+        return None
+    variants = recipe.image_variants or {}
+    if variants.get('source') != recipe.image.name:
+        variants = {}
+    urls = {}
+    for variant in IMAGE_VARIANTS:
+        name = variants.get(variant)
+        url = default_storage.url(name) if name else recipe.image.url
+        urls[variant] = (
+            request.build_absolute_uri(url) if request is not None else url
+        )
+    return urls
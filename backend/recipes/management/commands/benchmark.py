@@ -0,0 +1,285 @@
+import base64
+import io
+import json
+import platform
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.cache import bump_generation
+from recipes.benchmarking import git_commit, summarize
+from recipes.images import wait_for_variants
+from recipes.models import Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Follow
+
+UserModel = get_user_model()
+
+# Области кэша ответов: их поколения сбрасываются перед каждым замером,
+# чтобы измерялось построение ответа, а не попадание в кэш.
+RESPONSE_CACHE_SCOPES = ('recipes', 'trending', 'ingredients', 'tags')
+
+
+def image_payload():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (73, 182, 78)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет перцентили времени ответа и количество SQL-запросов '
+        'основных эндпоинтов API и сохраняет результат в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--output', help='Файл для сохранения результатов в JSON.')
+        parser.add_argument(
+            '--compare', help='JSON с результатами для сравнения.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый относительный рост p95 при сравнении.')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Запустить только указанные сценарии.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должно быть больше нуля.')
+        self.cold = options['cold']
+        user = self.pick_user()
+        token, _ = Token.objects.get_or_create(user=user)
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.payload = self.recipe_payload()
+        self.created = []
+        self.updates = 0
+
+        scenarios = self.scenarios(user)
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - scenarios.keys()
+            if unknown:
+                raise CommandError(
+                    f'Неизвестные сценарии: {", ".join(sorted(unknown))}. '
+                    f'Доступны: {", ".join(scenarios)}.')
+            scenarios = {
+                name: request for name, request in scenarios.items()
+                if name in options['scenarios']
+            }
+
+        results = {}
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(ALLOWED_HOSTS=hosts):
+            try:
+                for name, request in scenarios.items():
+                    results[name] = self.measure(
+                        request, options['iterations'], options['warmup'])
+                    self.stdout.write(self.format_line(name, results[name]))
+            finally:
+                Recipe.objects.filter(pk__in=self.created).delete()
+
+        self.meta = self.metadata(options, user)
+        report = {
+            'meta': self.meta,
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Результаты сохранены в {options["output"]}.'))
+        if options['compare']:
+            self.compare(results, options['compare'], options['threshold'])
+
+    def pick_user(self):
+        """
+        Пользователь с корзиной и подписками, чтобы персональные
+        эндпоинты отдавали непустые ответы.
+        """
+        user_id = (
+            ShoppingCart.objects.filter(
+                user__in=Follow.objects.values('user'))
+            .order_by('user_id').values_list('user_id', flat=True).first()
+        )
+        if user_id is None:
+            raise CommandError(
+                'Нет пользователей с корзиной и подписками, '
+                'выполните generate_data.')
+        return UserModel.objects.get(pk=user_id)
+
+    def recipe_payload(self):
+        ingredients = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)[:5])
+        tags = list(Tag.objects.order_by('id').values_list('id', flat=True))
+        if not ingredients or not tags:
+            raise CommandError('Нет ингредиентов или тегов.')
+        return {
+            'name': 'Рецепт для замеров',
+            'text': 'Создан командой benchmark.',
+            'cooking_time': 30,
+            'image': image_payload(),
+            'tags': tags[:2],
+            'ingredients': [
+                {'id': pk, 'amount': 10 * number}
+                for number, pk in enumerate(ingredients, start=1)
+            ],
+        }
+
+    def scenarios(self, user):
+        recipe_id = Recipe.objects.order_by(
+            '-favorites_count', '-id').values_list('id', flat=True).first()
+        if recipe_id is None:
+            raise CommandError('Нет рецептов, выполните generate_data.')
+        tags = list(Tag.objects.order_by('id').values_list('slug', flat=True))
+        return {
+            'recipe-list-anonymous': lambda: self.anonymous.get(
+                '/api/recipes/'),
+            'recipe-list': lambda: self.client.get('/api/recipes/'),
+            'recipe-list-tags': lambda: self.client.get(
+                '/api/recipes/', {'tags': tags[:2]}),
+            'recipe-detail': lambda: self.client.get(
+                f'/api/recipes/{recipe_id}/'),
+            'subscriptions': lambda: self.client.get(
+                '/api/users/subscriptions/'),
+            'download-shopping-cart': lambda: self.client.get(
+                '/api/recipes/download_shopping_cart/'),
+            'recipe-create': self.create_recipe,
+            'recipe-update': self.update_recipe,
+        }
+
+    def create_recipe(self):
+        response = self.client.post(
+            '/api/recipes/', self.payload, format='json')
+        if response.status_code == 201:
+            self.created.append(response.data['id'])
+        return response
+
+    def update_recipe(self):
+        if not self.created:
+            self.create_recipe()
+        self.updates += 1
+        payload = dict(
+            self.payload,
+            cooking_time=self.payload['cooking_time'] + self.updates % 2,
+            ingredients=self.payload['ingredients'][self.updates % 2:],
+        )
+        return self.client.patch(
+            f'/api/recipes/{self.created[0]}/', payload, format='json')
+
+    def measure(self, request, iterations, warmup):
+        for _ in range(warmup):
+            self.check_response(request())
+            wait_for_variants()
+        timings = []
+        queries = []
+        for _ in range(iterations):
+            if self.cold:
+                cache.clear()
+            else:
+                bump_generation(*RESPONSE_CACHE_SCOPES)
+            with ExitStack() as stack:
+                captured = [
+                    stack.enter_context(CaptureQueriesContext(alias))
+                    for alias in connections.all()
+                ]
+                started = time.perf_counter()
+                self.check_response(request())
+                timings.append(time.perf_counter() - started)
+            wait_for_variants()
+            queries.append(sum(len(context) for context in captured))
+        return summarize(timings, queries)
+
+    def check_response(self, response):
+        """
+        Проверяет статус и дочитывает потоковый ответ: его содержимое
+        строится и запрашивается из базы только при чтении.
+        """
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{response.request["REQUEST_METHOD"]} '
+                f'{response.request["PATH_INFO"]}: '
+                f'{response.status_code} {getattr(response, "data", "")}')
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+
+    def format_line(self, name, result):
+        return (
+            f'{name:<24} p50 {result["p50_ms"]:8.2f} мс  '
+            f'p95 {result["p95_ms"]:8.2f} мс  '
+            f'p99 {result["p99_ms"]:8.2f} мс  '
+            f'запросов {result["queries"]}'
+        )
+
+    def metadata(self, options, user):
+        return {
+            'commit': git_commit(),
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'iterations': options['iterations'],
+            'warmup': options['warmup'],
+            'cold': options['cold'],
+            'user': user.pk,
+            'data': {
+                'users': UserModel.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+        }
+
+    def compare(self, results, path, threshold):
+        """
+        Сравнивает p95 и количество запросов с сохраненными результатами.
+        """
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        self.stdout.write(
+            f'Сравнение с {path} (коммит '
+            f'{baseline.get("meta", {}).get("commit")}):')
+        previous_meta = baseline.get('meta', {})
+        for key in ('cold', 'database', 'data'):
+            if previous_meta.get(key) != self.meta.get(key):
+                self.stdout.write(self.style.WARNING(
+                    f'Условия замера отличаются ({key}): '
+                    f'{previous_meta.get(key)} -> {self.meta.get(key)}.'))
+        regressions = []
+        for name, result in results.items():
+            previous = baseline.get('results', {}).get(name)
+            if previous is None:
+                continue
+            change = result['p95_ms'] / previous['p95_ms'] - 1
+            queries = result['queries'] - previous['queries']
+            slower = change > threshold
+            if slower or queries > 0:
+                regressions.append(name)
+            line = (
+                f'{name:<24} p95 {previous["p95_ms"]:8.2f} -> '
+                f'{result["p95_ms"]:8.2f} мс ({change:+.0%}), '
+                f'запросов {previous["queries"]} -> {result["queries"]}'
+            )
+            style = (
+                self.style.ERROR if slower or queries > 0
+                else self.style.SUCCESS
+            )
+            self.stdout.write(style(line))
+        if regressions:
+            raise CommandError(f'Регрессии: {", ".join(regressions)}.')
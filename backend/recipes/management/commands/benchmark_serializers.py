@@ -0,0 +1,122 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.compiled import CompiledReadMixin
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import RecipeReadSerializer, RecipeShortSerializer
+from recipes.benchmarking import git_commit
+from recipes.models import Recipe
+from users.serializers import CustomUserSerializer
+
+UserModel = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает стоимость сериализации и рендеринга одного объекта '
+        'в DRF и в компилированном режиме и проверяет, что ответы '
+        'совпадают побайтно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objects', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--output', help='Файл для сохранения результатов в JSON.')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        limit = options['objects']
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        context = {'request': request}
+        recipes = list(Recipe.objects.for_feed(request.user)[:limit])
+        users = list(UserModel.objects.order_by('id')[:limit])
+        for user in users:
+            user.is_subscribed = False
+        if not recipes or not users:
+            raise CommandError('Нет данных, выполните generate_data.')
+
+        cases = {
+            'recipe': (RecipeReadSerializer, recipes),
+            'recipe-short': (RecipeShortSerializer, recipes),
+            'user': (CustomUserSerializer, users),
+        }
+        results = {}
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(ALLOWED_HOSTS=hosts):
+            for name, (serializer_class, objects) in cases.items():
+                results[name] = self.measure(
+                    serializer_class, objects, context)
+                self.stdout.write(self.format_line(name, results[name]))
+
+        if options['output']:
+            report = {
+                'meta': {
+                    'commit': git_commit(),
+                    'orjson': orjson is not None,
+                    'objects': limit,
+                    'repeat': self.repeat,
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def per_object(self, function, count):
+        """
+        Лучшее из repeat измерений в микросекундах на объект.
+        """
+        best = None
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return round(best / count * 1e6, 2)
+
+    def serialize(self, serializer_class, objects, context, compiled):
+        CompiledReadMixin.compiled_representation = compiled
+        try:
+            return serializer_class(objects, many=True, context=context).data
+        finally:
+            CompiledReadMixin.compiled_representation = True
+
+    def measure(self, serializer_class, objects, context):
+        count = len(objects)
+        drf_data = self.serialize(serializer_class, objects, context, False)
+        data = self.serialize(serializer_class, objects, context, True)
+        rendered = FastJSONRenderer().render(data)
+        if rendered != JSONRenderer().render(drf_data):
+            raise CommandError(
+                f'{serializer_class.__name__}: ответы различаются.')
+        return {
+            'drf_serialize_us': self.per_object(
+                lambda: self.serialize(
+                    serializer_class, objects, context, False), count),
+            'compiled_serialize_us': self.per_object(
+                lambda: self.serialize(
+                    serializer_class, objects, context, True), count),
+            'json_render_us': self.per_object(
+                lambda: JSONRenderer().render(data), count),
+            'fast_render_us': self.per_object(
+                lambda: FastJSONRenderer().render(data), count),
+            'bytes_per_object': round(len(rendered) / count),
+        }
+
+    def format_line(self, name, result):
+        return (
+            f'{name:<14} сериализация {result["drf_serialize_us"]:8.1f} -> '
+            f'{result["compiled_serialize_us"]:8.1f} мкс, '
+            f'рендеринг {result["json_render_us"]:6.1f} -> '
+            f'{result["fast_render_us"]:6.1f} мкс на объект'
+        )
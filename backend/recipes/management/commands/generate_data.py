@@ -0,0 +1,221 @@
+import io
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from faker import Faker
+from PIL import Image
+
+from api.cache import bump_generation
+from recipes.images import generate_variants
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingCart,
+    Tag
+)
+from recipes.registry import tag_registry
+from users.models import Follow
+
+UserModel = get_user_model()
+
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Выпечка', '#B5651D', 'baking'),
+)
+PASSWORD = 'benchmark-password'
+
+
+def zipf_weights(size, exponent=1.1):
+    """
+    Веса популярности по закону Ципфа: немногие элементы встречаются
+    часто, большинство - редко.
+    """
+    return [1 / (rank + 1) ** exponent for rank in range(size)]
+
+
+def weighted_sample(rng, population, weights, size):
+    """
+    Выборка без повторов с учетом весов.
+    """
+    size = min(size, len(population))
+    chosen = set()
+    while len(chosen) < size:
+        chosen.update(rng.choices(population, weights, k=size - len(chosen)))
+    return list(chosen)
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетических пользователей, рецепты, подписки, '
+        'избранное и корзины для нагрузочного тестирования.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Среднее количество подписок на пользователя.')
+        parser.add_argument(
+            '--favorites', type=int, default=30,
+            help='Среднее количество рецептов в избранном пользователя.')
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Среднее количество рецептов в корзине пользователя.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Справочник ингредиентов пуст, выполните load_ingredients.')
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+
+        started = time.monotonic()
+        with transaction.atomic():
+            tag_ids = self.create_tags()
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                options['recipes'], user_ids, ingredient_ids, tag_ids)
+            self.create_links(
+                Follow, 'author_id', user_ids, user_ids, options['follows'],
+                exclude_self=True)
+            self.create_links(
+                Favorite, 'recipe_id', user_ids, recipe_ids,
+                options['favorites'])
+            self.create_links(
+                ShoppingCart, 'recipe_id', user_ids, recipe_ids,
+                options['carts'])
+
+        call_command('reconcile_counters', stdout=io.StringIO())
+        call_command(
+            'rebuild_shopping_list', '--user', *map(str, user_ids),
+            stdout=io.StringIO())
+        call_command('refresh_trending', '--full', stdout=io.StringIO())
+        bump_generation('recipes', 'tags')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}, '
+            f'время: {time.monotonic() - started:.1f} с. '
+            f'Пароль пользователей: {PASSWORD}'
+        ))
+
+    def create_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS
+            )
+            tag_registry.invalidate()
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def create_users(self, count):
+        start = UserModel.objects.count()
+        password = make_password(PASSWORD)
+        users = []
+        for number in range(start, start + count):
+            first_name = self.fake.first_name()
+            last_name = self.fake.last_name()
+            users.append(UserModel(
+                username=f'bench{number}',
+                email=f'bench{number}@example.com',
+                first_name=first_name,
+                last_name=last_name,
+                password=password,
+            ))
+        UserModel.objects.bulk_create(users, batch_size=self.batch_size)
+        return list(UserModel.objects.filter(
+            username__in=[user.username for user in users]
+        ).values_list('id', flat=True))
+
+    def create_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), (226, 108, 45)).save(buffer, 'JPEG')
+        return default_storage.save(
+            'recipes/benchmark.jpg', ContentFile(buffer.getvalue()))
+
+    def create_recipes(self, count, user_ids, ingredient_ids, tag_ids):
+        """
+        Создает рецепты: авторы и ингредиенты распределены по Ципфу,
+        в рецепте от 3 до 15 ингредиентов и от 1 до 3 тегов.
+        """
+        image = self.create_image()
+        author_weights = zipf_weights(len(user_ids))
+        ingredient_weights = zipf_weights(len(ingredient_ids))
+        recipes = [
+            Recipe(
+                name=self.fake.sentence(nb_words=3)[:200].rstrip('.'),
+                text=self.fake.paragraph(nb_sentences=5),
+                author_id=self.rng.choices(user_ids, author_weights)[0],
+                cooking_time=self.rng.randint(5, 180),
+                image=image,
+            )
+            for _ in range(count)
+        ]
+        Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+        recipe_ids = list(Recipe.objects.filter(
+            author_id__in=user_ids).order_by('id').values_list(
+                'id', flat=True))
+        if recipe_ids:
+            generate_variants(recipe_ids[0])
+            Recipe.objects.filter(id__in=recipe_ids).update(
+                image_variants=Recipe.objects.get(
+                    id=recipe_ids[0]).image_variants)
+
+        through = Recipe.tags.through
+        tags = []
+        ingredients = []
+        for recipe_id in recipe_ids:
+            for tag_id in self.rng.sample(
+                    tag_ids, self.rng.randint(1, min(3, len(tag_ids)))):
+                tags.append(through(recipe_id=recipe_id, tag_id=tag_id))
+            size = max(3, min(15, int(self.rng.gauss(8, 3))))
+            for ingredient_id in weighted_sample(
+                    self.rng, ingredient_ids, ingredient_weights, size):
+                ingredients.append(IngredientInRecipe(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.choice((1, 2, 3, 5, 10, 50, 100, 250)),
+                ))
+        through.objects.bulk_create(tags, batch_size=self.batch_size)
+        IngredientInRecipe.objects.bulk_create(
+            ingredients, batch_size=self.batch_size)
+        return recipe_ids
+
+    def create_links(self, model, field, user_ids, target_ids, mean,
+                     exclude_self=False):
+        """
+        Создает связи пользователей с популярными по Ципфу объектами;
+        количество связей у пользователя распределено экспоненциально.
+        """
+        weights = zipf_weights(len(target_ids))
+        rows = []
+        for user_id in user_ids:
+            size = min(
+                int(self.rng.expovariate(1 / mean)) if mean else 0,
+                len(target_ids) - 1,
+            )
+            for target_id in weighted_sample(
+                    self.rng, target_ids, weights, size):
+                if exclude_self and target_id == user_id:
+                    continue
+                rows.append(model(user_id=user_id, **{field: target_id}))
+        model.objects.bulk_create(
+            rows, batch_size=self.batch_size, ignore_conflicts=True)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные WebP-копии изображений рецептов, '
+        'для которых они еще не построены.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить варианты для всех рецептов.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'image', 'image_variants').order_by('id')
+        processed = failed = 0
+        for recipe in recipes.iterator():
+            variants = recipe.image_variants or {}
+            if not options['all'] and (
+                    variants.get('source') == recipe.image.name):
+                continue
+            try:
+                generate_variants(recipe.id)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}, с ошибками: {failed}.'))
@@ -0,0 +1,65 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import bump_generation
+from foodgram.storage import HashedMediaStorage, is_hashed_name
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит изображения рецептов под имена из хэша содержимого '
+        'и перестраивает их уменьшенные копии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete-originals',
+            action='store_true',
+            help='Удалить старые файлы, на которые больше нет ссылок.',
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, HashedMediaStorage):
+            raise CommandError(
+                'DEFAULT_FILE_STORAGE должно быть HashedMediaStorage.')
+
+        recipes = Recipe.objects.exclude(image='').only(
+            'image', 'image_variants').order_by('id')
+        renamed = {}
+        obsolete = set()
+        moved = missing = 0
+        for recipe in recipes.iterator():
+            old_name = recipe.image.name
+            if is_hashed_name(old_name):
+                continue
+            if old_name not in renamed:
+                if not default_storage.exists(old_name):
+                    missing += 1
+                    self.stderr.write(
+                        f'Рецепт {recipe.id}: файл {old_name} не найден.')
+                    continue
+                with default_storage.open(old_name) as file:
+                    renamed[old_name] = default_storage.save(old_name, file)
+            obsolete.update(
+                name for key, name in (recipe.image_variants or {}).items()
+                if key != 'source' and not is_hashed_name(name)
+            )
+            Recipe.objects.filter(pk=recipe.pk, image=old_name).update(
+                image=renamed[old_name])
+            generate_variants(recipe.pk)
+            moved += 1
+
+        if options['delete_originals']:
+            still_used = set(Recipe.objects.filter(
+                image__in=list(renamed)).values_list('image', flat=True))
+            for old_name in renamed.keys() - still_used:
+                default_storage.delete(old_name)
+            for name in obsolete:
+                default_storage.delete(name)
+
+        if moved:
+            bump_generation('recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено изображений: {moved}, не найдено: {missing}.'))
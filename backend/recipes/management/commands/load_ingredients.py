@@ -1,19 +1,196 @@
+import csv
+import io
 import json
-from django.core.management.base import BaseCommand
+import time
+from itertools import islice
+from pathlib import Path
 
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import bump_generation
+from recipes.autocomplete import ingredient_catalog
 from recipes.models import Ingredient
 
+DEFAULT_PATH = Path(__file__).resolve().parent / 'data' / 'ingredients.json'
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    """
+    Читает пары (название, единица измерения) из CSV построчно.
+    """
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1] if len(row) > 1 else ''
+
+
+def read_json(file):
+    """
+    Читает пары (название, единица измерения) из JSON-массива объектов
+    по частям, не загружая файл в память целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(READ_CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and (
+                    buffer[position].isspace() or buffer[position] in ',]'):
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидается JSON-массив ингредиентов.')
+                started = True
+                position += 1
+                continue
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break
+            yield item['name'], item.get('measurement_unit', '')
+        if not chunk:
+            if buffer[position:].strip():
+                raise CommandError('Файл ингредиентов поврежден.')
+            return
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
 
 class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV или JSON пакетами. '
+        'Существующие ингредиенты обновляются, повторный запуск безопасен.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=str(DEFAULT_PATH),
+            help='Путь к файлу ингредиентов (.csv или .json).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном пакете.',
+        )
 
     def handle(self, *args, **options):
-        with open(
-            'recipes/management/commands/data/ingredients.json', 'rb'
-        ) as f:
-            data = json.load(f)
-            for item in data:
-                print(item)
-                Ingredient.objects.create(
-                    name=item['name'],
-                    measurement_unit=item['measurement_unit']
+        self.verbosity = options['verbosity']
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден.')
+
+        started = time.monotonic()
+        with path.open(encoding='utf-8') as file, transaction.atomic():
+            if connection.vendor == 'postgresql':
+                total, created = self.load_with_copy(
+                    reader(file), options['batch_size'])
+            else:
+                total, created = self.load_in_batches(
+                    reader(file), options['batch_size'])
+        ingredient_catalog.invalidate()
+        bump_generation('ingredients', 'recipes')
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано строк: {total}, новых ингредиентов: {created}, '
+            f'время: {elapsed:.2f} с, '
+            f'{total / elapsed if elapsed else total:.0f} строк/с.'
+        ))
+
+    def batches(self, rows, batch_size):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def report(self, total, started):
+        if self.verbosity < 2:
+            return
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Обработано строк: {total} '
+            f'({total / elapsed if elapsed else total:.0f} строк/с)'
+        )
+
+    def load_in_batches(self, rows, batch_size):
+        """
+        Загружает ингредиенты через bulk_create и bulk_update.
+        """
+        total = created = 0
+        started = time.monotonic()
+        for batch in self.batches(rows, batch_size):
+            units = dict(batch)
+            existing = Ingredient.objects.in_bulk(
+                list(units), field_name='name')
+            new = [
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in units.items() if name not in existing
+            ]
+            changed = []
+            for name, ingredient in existing.items():
+                if ingredient.measurement_unit != units[name]:
+                    ingredient.measurement_unit = units[name]
+                    changed.append(ingredient)
+            Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+            Ingredient.objects.bulk_update(changed, ('measurement_unit',))
+            total += len(batch)
+            created += len(new)
+            self.report(total, started)
+        return total, created
+
+    def load_with_copy(self, rows, batch_size):
+        """
+        Загружает ингредиенты через COPY во временную таблицу
+        и один INSERT ... ON CONFLICT.
+        """
+        table = Ingredient._meta.db_table
+        total = 0
+        started = time.monotonic()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                '(position serial, name text, measurement_unit text) '
+                'ON COMMIT DROP'
+            )
+            for batch in self.batches(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_import (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    buffer
                 )
+                total += len(batch)
+                self.report(total, started)
+            cursor.execute(f'SELECT count(*) FROM {table}')
+            before = cursor.fetchone()[0]
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT ON (name) name, measurement_unit '
+                'FROM ingredient_import ORDER BY name, position DESC '
+                'ON CONFLICT (name) DO UPDATE '
+                'SET measurement_unit = EXCLUDED.measurement_unit '
+                f'WHERE {table}.measurement_unit '
+                'IS DISTINCT FROM EXCLUDED.measurement_unit'
+            )
+            cursor.execute(f'SELECT count(*) FROM {table}')
+            created = cursor.fetchone()[0] - before
+        return total, created
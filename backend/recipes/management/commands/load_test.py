@@ -0,0 +1,127 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipes.benchmarking import git_commit, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает запущенный сервер параллельными запросами к эндпоинтам '
+        'чтения и измеряет пропускную способность и перцентили времени '
+        'ответа.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'url', help='Адрес сервера, например http://127.0.0.1:8000.')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument(
+            '--requests', type=int, default=1000,
+            help='Количество запросов на сценарий.')
+        parser.add_argument(
+            '--token', help='Токен пользователя для персональных сценариев.')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument(
+            '--output', help='Файл для сохранения результатов в JSON.')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError(
+                '--concurrency и --requests должны быть больше нуля.')
+        self.base_url = options['url'].rstrip('/') + '/'
+        self.timeout = options['timeout']
+        self.headers = {'Accept': 'application/json'}
+        if options['token']:
+            self.headers['Authorization'] = f'Token {options["token"]}'
+
+        results = {}
+        for name, path in self.scenarios(options['token']).items():
+            results[name] = self.run(
+                path, options['requests'], options['concurrency'])
+            self.stdout.write(self.format_line(name, results[name]))
+
+        if options['output']:
+            report = {
+                'meta': {
+                    'commit': git_commit(),
+                    'timestamp': timezone.now().isoformat(),
+                    'url': options['url'],
+                    'concurrency': options['concurrency'],
+                    'requests': options['requests'],
+                    'authenticated': bool(options['token']),
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Результаты сохранены в {options["output"]}.'))
+
+    def fetch(self, path):
+        """
+        Выполняет GET-запрос и возвращает (статус, время в секундах).
+        """
+        request = Request(urljoin(self.base_url, path), headers=self.headers)
+        started = time.perf_counter()
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except HTTPError as error:
+            status = error.code
+        except (URLError, OSError):
+            status = None
+        return status, time.perf_counter() - started
+
+    def scenarios(self, token):
+        request = Request(
+            urljoin(self.base_url, 'api/recipes/?limit=1'),
+            headers=self.headers)
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                recipes = json.load(response)['results']
+        except (URLError, OSError, ValueError, KeyError) as error:
+            raise CommandError(
+                f'Сервер {self.base_url} недоступен: {error}.')
+        scenarios = {
+            'recipe-list': 'api/recipes/',
+            'tag-list': 'api/tags/',
+            'ingredient-search': 'api/ingredients/?name=%D1%81%D0%BE',
+        }
+        if recipes:
+            scenarios['recipe-detail'] = f'api/recipes/{recipes[0]["id"]}/'
+        if token:
+            scenarios['subscriptions'] = 'api/users/subscriptions/'
+        return scenarios
+
+    def run(self, path, total, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            responses = list(executor.map(self.fetch, [path] * total))
+        elapsed = time.perf_counter() - started
+        timings = [timing for status, timing in responses if status == 200]
+        errors = total - len(timings)
+        if not timings:
+            raise CommandError(f'{path}: все запросы завершились ошибкой.')
+        result = summarize(timings)
+        result.update(
+            requests=total,
+            errors=errors,
+            rps=round(total / elapsed, 1),
+        )
+        return result
+
+    def format_line(self, name, result):
+        return (
+            f'{name:<20} {result["rps"]:8.1f} зап/с  '
+            f'p50 {result["p50_ms"]:8.2f} мс  '
+            f'p99 {result["p99_ms"]:8.2f} мс  '
+            f'ошибок {result["errors"]}'
+        )
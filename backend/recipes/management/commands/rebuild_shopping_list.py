@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает или проверяет материализованные списки покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сравнить списки покупок с корзинами пользователей.',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            nargs='+',
+            dest='user_ids',
+            help='Ограничиться пользователями с указанными id.',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if not options['verify']:
+            ShoppingListItem.objects.rebuild(user_ids)
+            self.stdout.write(
+                self.style.SUCCESS('Списки покупок пересобраны.'))
+            return
+
+        expected = {
+            (row['user_id'], row['ingredient_id']): row['total_amount']
+            for row in ShoppingListItem.objects.expected(user_ids)
+        }
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        actual = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount in items.values_list(
+                'user_id', 'ingredient_id', 'total_amount')
+        }
+        mismatches = [
+            (key, expected.get(key, 0), actual.get(key, 0))
+            for key in expected.keys() | actual.keys()
+            if expected.get(key, 0) != actual.get(key, 0)
+        ]
+        for (user_id, ingredient_id), need, have in sorted(mismatches):
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'ожидалось {need}, в таблице {have}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatches)}.')
+        self.stdout.write(self.style.SUCCESS('Списки покупок согласованы.'))
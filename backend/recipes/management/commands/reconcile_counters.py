@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счетчики избранного, корзин, рецептов и подписок '
+        'с фактическими данными и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только проверить счетчики, ничего не исправляя.',
+        )
+
+    def handle(self, *args, **options):
+        verify = options['verify']
+        mismatches = reconcile(fix=not verify)
+        for (label, field), count in mismatches.items():
+            if count:
+                self.stdout.write(f'{label}.{field}: расхождений {count}')
+        total = sum(mismatches.values())
+        if verify and total:
+            raise CommandError(f'Счетчики расходятся у {total} объектов.')
+        if total:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено счетчиков: {total}.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Счетчики согласованы.'))
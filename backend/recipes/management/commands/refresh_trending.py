@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.cache import bump_generation
+from foodgram.constants import TRENDING_REFRESH_INTERVAL
+from recipes.trending import refresh
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинг популярности рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Построить рейтинг заново вместо инкрементального пересчета.',
+        )
+        parser.add_argument(
+            '--loop',
+            nargs='?',
+            type=int,
+            const=TRENDING_REFRESH_INTERVAL,
+            metavar='SECONDS',
+            help='Пересчитывать рейтинг каждые SECONDS секунд.',
+        )
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            started = time.monotonic()
+            updated = refresh(full=full)
+            bump_generation('trending')
+            self.stdout.write(self.style.SUCCESS(
+                f'Рейтинг обновлен: рецептов с новыми событиями {updated}, '
+                f'время {time.monotonic() - started:.2f} с.'
+            ))
+            if options['loop'] is None:
+                return
+            full = False
+            close_old_connections()
+            time.sleep(options['loop'])
@@ -0,0 +1,126 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = '''
+CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_update()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_ingredientinrecipe AS item
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = item.ingredient_id
+            WHERE item.recipe_id = NEW.id
+        ), '')), 'B')
+        || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_recipe_search_vector
+BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector_update();
+
+CREATE OR REPLACE FUNCTION recipes_ingredientinrecipe_inserted()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE recipes_recipe SET name = name
+    WHERE id IN (SELECT recipe_id FROM inserted_rows);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION recipes_ingredientinrecipe_deleted()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE recipes_recipe SET name = name
+    WHERE id IN (SELECT recipe_id FROM deleted_rows);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_ingredientinrecipe_search_insert
+AFTER INSERT ON recipes_ingredientinrecipe
+REFERENCING NEW TABLE AS inserted_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE recipes_ingredientinrecipe_inserted();
+
+CREATE TRIGGER recipes_ingredientinrecipe_search_update
+AFTER UPDATE ON recipes_ingredientinrecipe
+REFERENCING NEW TABLE AS inserted_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE recipes_ingredientinrecipe_inserted();
+
+CREATE TRIGGER recipes_ingredientinrecipe_search_delete
+AFTER DELETE ON recipes_ingredientinrecipe
+REFERENCING OLD TABLE AS deleted_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE recipes_ingredientinrecipe_deleted();
+
+CREATE OR REPLACE FUNCTION recipes_ingredient_renamed()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE recipes_recipe SET name = name
+    WHERE id IN (
+        SELECT item.recipe_id
+        FROM recipes_ingredientinrecipe AS item
+        JOIN inserted_rows ON inserted_rows.id = item.ingredient_id
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_ingredient_search_rename
+AFTER UPDATE ON recipes_ingredient
+REFERENCING NEW TABLE AS inserted_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE recipes_ingredient_renamed();
+
+CREATE INDEX recipes_recipe_search_vector_gin
+ON recipes_recipe USING gin (search_vector);
+
+UPDATE recipes_recipe SET name = name;
+'''
+
+DROP_SEARCH_VECTOR_SQL = '''
+DROP INDEX IF EXISTS recipes_recipe_search_vector_gin;
+DROP TRIGGER IF EXISTS recipes_ingredient_search_rename
+    ON recipes_ingredient;
+DROP TRIGGER IF EXISTS recipes_ingredientinrecipe_search_delete
+    ON recipes_ingredientinrecipe;
+DROP TRIGGER IF EXISTS recipes_ingredientinrecipe_search_update
+    ON recipes_ingredientinrecipe;
+DROP TRIGGER IF EXISTS recipes_ingredientinrecipe_search_insert
+    ON recipes_ingredientinrecipe;
+DROP TRIGGER IF EXISTS recipes_recipe_search_vector ON recipes_recipe;
+DROP FUNCTION IF EXISTS recipes_ingredient_renamed();
+DROP FUNCTION IF EXISTS recipes_ingredientinrecipe_deleted();
+DROP FUNCTION IF EXISTS recipes_ingredientinrecipe_inserted();
+DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update();
+'''
+
+
+def create_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(SEARCH_VECTOR_SQL)
+
+
+def drop_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_SEARCH_VECTOR_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_triggers, drop_search_triggers),
+    ]
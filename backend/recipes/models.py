@@ -1,14 +1,36 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import RegexValidator, MinValueValidator
-from django.db import models
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVectorField
+)
+from django.db import connections, models, transaction
+from django.db.models import (
+    BooleanField,
+    Case,
+    Exists,
+    F,
+    FloatField,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Sum,
+    Value,
+    When
+)
+from django.db.models.functions import Cast, Greatest
 
 from foodgram.constants import (
     INGREDIENT_MIN_AMOUNT,
     INGREDIENT_DEFAULT_AMOUNT,
     COOKING_TIME_MIN_VALUE,
-    COOKING_TIME_DEFAULT_VALUE
-
+    COOKING_TIME_DEFAULT_VALUE,
+    RECIPE_SEARCH_CONFIG
 )
+from foodgram.models import CounterFieldsMixin
+from users.models import Follow
 
 UserModel = get_user_model()
 
@@ -81,7 +103,80 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """
+    QuerySet рецептов с подготовкой данных для ленты.
+    """
+
+    def for_feed(self, user):
+        """
+        Подгружает автора, теги и ингредиенты рецептов и аннотирует
+        флаги избранного, корзины и подписки на автора для пользователя.
+        """
+        queryset = self.defer('search_vector').select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientinrecipes',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient').order_by('ingredient__name')
+            ),
+        )
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                is_author_subscribed=Value(False, output_field=BooleanField()),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_author_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def popular(self):
+        """
+        Сортирует рецепты по числу добавлений в избранное.
+        """
+        return self.order_by('-favorites_count', '-id')
+
+    def trending(self):
+        """
+        Оставляет рецепты с рейтингом популярности и сортирует по нему.
+        """
+        return self.filter(trend__isnull=False).annotate(
+            trend_score=F('trend__score')
+        ).order_by('-trend_score', '-id')
+
+    def search(self, query):
+        """
+        Ищет рецепты по названию, описанию и ингредиентам.
+
+        В PostgreSQL используется поисковый вектор рецепта и результаты
+        упорядочиваются по релевантности, в остальных базах - поиск
+        по подстроке.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return self.filter(
+                Q(name__icontains=query)
+                | Q(text__icontains=query)
+                | Q(ingredients__name__icontains=query)
+            ).distinct()
+        search_query = SearchQuery(
+            query, config=RECIPE_SEARCH_CONFIG, search_type='websearch')
+        # ts_rank возвращает real; double precision точно переживает
+        # сохранение в курсоре пагинации и сравнение с ним.
+        return self.filter(search_vector=search_query).annotate(
+            search_rank=Cast(
+                SearchRank(F('search_vector'), search_query), FloatField())
+        ).order_by('-search_rank', '-id')
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """
     Модель для рецепта.
     """
@@ -103,6 +198,12 @@ class Recipe(models.Model):
         verbose_name='Изображение',
         upload_to='recipes/'
     )
+    image_variants = models.JSONField(
+        verbose_name='Варианты изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления (в минутах)',
         help_text='Введите время приготовления (мин)',
@@ -123,9 +224,33 @@ class Recipe(models.Model):
         verbose_name='Теги',
         related_name='recipes'
     )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     class Meta:
         ordering = ('-id',)
+        indexes = (
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_popular_idx'
+            ),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -190,6 +315,11 @@ class Favorite(models.Model):
         verbose_name='Рецепт',
         related_name='favorites'
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -221,6 +351,11 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт',
         related_name='shopping_cart'
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Корзина покупок'
@@ -234,3 +369,172 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} добавил "{self.recipe}" в Корзину покупок'
+
+
+class ShoppingListItemManager(models.Manager):
+    """
+    Менеджер материализованного списка покупок.
+    """
+
+    def apply_deltas(self, user_ids, deltas):
+        """
+        Прибавляет изменения количества ингредиентов {ingredient_id: delta}
+        к спискам покупок пользователей и удаляет опустевшие позиции.
+        """
+        user_ids = list(user_ids)
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta
+        }
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                [
+                    self.model(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=0
+                    )
+                    for user_id in user_ids for ingredient_id in deltas
+                ],
+                ignore_conflicts=True,
+            )
+            items = self.filter(
+                user_id__in=user_ids, ingredient_id__in=deltas)
+            items.update(total_amount=Greatest(
+                F('total_amount') + Case(
+                    *(When(ingredient_id=ingredient_id, then=Value(delta))
+                      for ingredient_id, delta in deltas.items()),
+                    output_field=IntegerField(),
+                ),
+                Value(0),
+            ))
+            items.filter(total_amount=0).delete()
+
+    def add_recipes(self, user_ids, recipe_ids):
+        """
+        Добавляет ингредиенты рецептов в списки покупок пользователей.
+        """
+        self.apply_deltas(user_ids, self.recipe_amounts(recipe_ids))
+
+    def remove_recipes(self, user_ids, recipe_ids):
+        """
+        Вычитает ингредиенты рецептов из списков покупок пользователей.
+        """
+        self.apply_deltas(user_ids, {
+            ingredient_id: -amount
+            for ingredient_id, amount
+            in self.recipe_amounts(recipe_ids).items()
+        })
+
+    def recipe_amounts(self, recipe_ids):
+        """
+        Возвращает суммарное количество ингредиентов в рецептах.
+        """
+        return dict(
+            IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values('ingredient_id').annotate(
+                total=Sum('amount')
+            ).values_list('ingredient_id', 'total')
+        )
+
+    def expected(self, user_ids=None):
+        """
+        Собирает список покупок из корзин пользователей заново.
+        """
+        rows = IngredientInRecipe.objects.values(
+            'ingredient_id', user_id=F('recipe__shopping_cart__user')
+        )
+        if user_ids is None:
+            rows = rows.filter(user_id__isnull=False)
+        else:
+            rows = rows.filter(user_id__in=user_ids)
+        return rows.annotate(total_amount=Sum('amount')).order_by()
+
+    def rebuild(self, user_ids=None):
+        """
+        Пересобирает списки покупок пользователей по их корзинам.
+        """
+        items = self.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        with transaction.atomic():
+            items.delete()
+            self.bulk_create(
+                (self.model(**row) for row in self.expected(user_ids)),
+                batch_size=1000,
+            )
+
+
+class ShoppingListItem(models.Model):
+    """
+    Модель для позиции материализованного списка покупок.
+    """
+    user = models.ForeignKey(
+        UserModel,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество'
+    )
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.total_amount}'
+
+
+class RecipeTrend(models.Model):
+    """
+    Предрассчитанный рейтинг популярности рецепта.
+
+    score - сумма добавлений в избранное и корзину с весами, затухающими
+    экспоненциально с возрастом добавления. Обновляется командой
+    refresh_trending.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='trend'
+    )
+    score = models.FloatField(
+        verbose_name='Рейтинг',
+        default=0
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата пересчета'
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = (
+            models.Index(
+                fields=('-score', '-recipe'),
+                name='recipe_trend_score_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe}: {self.score:.2f}'
@@ -0,0 +1,87 @@
+import threading
+import time
+
+from django.db import DEFAULT_DB_ALIAS
+
+from foodgram.constants import TAG_REGISTRY_TIMEOUT
+from recipes.autocomplete import bump_version, get_version
+
+VERSION_KEY = 'recipes:tags:version'
+
+
+class TagSet:
+    """
+    Неизменяемый снимок таблицы тегов с поиском по id и слагу.
+    """
+
+    def __init__(self, tags):
+        self.tags = tuple(tags)
+        self.by_id = {tag.id: tag for tag in self.tags}
+        self.by_slug = {tag.slug: tag for tag in self.tags}
+
+
+class TagRegistry:
+    """
+    Теги в памяти процесса с инвалидацией по счетчику версий.
+
+    Тегов немного, и меняются они редко, поэтому фильтры, проверка
+    при записи рецепта и эндпоинт тегов читают их отсюда, а не из базы.
+    Счетчик хранится в кэше Django, так что при общем бэкенде кэша
+    изменение тега сбрасывает реестр во всех процессах; кроме того,
+    реестр перечитывается раз в TAG_REGISTRY_TIMEOUT секунд и при
+    поиске тега, которого в нем нет. Теги читаются из основной базы:
+    реплика сразу после изменения может отдать старые строки, и они
+    остались бы в реестре до следующей версии.
+
+    Возвращаемые объекты общие для всех запросов процесса,
+    изменять их нельзя.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tags = None
+        self._version = None
+        self._expires = 0
+
+    def get_tags(self, reload=False):
+        version = get_version(VERSION_KEY)
+        tags = self._tags
+        if (
+            reload
+            or tags is None
+            or version != self._version
+            or self._expires < time.monotonic()
+        ):
+            from recipes.models import Tag
+
+            with self._lock:
+                tags = TagSet(
+                    Tag.objects.using(DEFAULT_DB_ALIAS).order_by('id'))
+                self._tags = tags
+                self._version = version
+                self._expires = time.monotonic() + TAG_REGISTRY_TIMEOUT
+        return tags
+
+    def all(self):
+        return self.get_tags().tags
+
+    def get(self, pk):
+        tag = self.get_tags().by_id.get(pk)
+        if tag is None:
+            tag = self.get_tags(reload=True).by_id.get(pk)
+        return tag
+
+    def get_by_slug(self, slug):
+        tag = self.get_tags().by_slug.get(slug)
+        if tag is None:
+            tag = self.get_tags(reload=True).by_slug.get(slug)
+        return tag
+
+    def choices(self):
+        return [(tag.slug, tag.name) for tag in self.all()]
+
+    def invalidate(self):
+        bump_version(VERSION_KEY)
+
+
+tag_registry = TagRegistry()
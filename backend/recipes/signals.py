@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.autocomplete import ingredient_catalog
+from recipes.counters import UserModel, adjust_counter
+from recipes.images import schedule_variants
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Tag
+)
+from recipes.registry import tag_registry
+from users.models import Follow
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_catalog(**kwargs):
+    """
+    Сбрасывает индекс ингредиентов при изменении справочника.
+    """
+    transaction.on_commit(ingredient_catalog.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_registry(**kwargs):
+    """
+    Сбрасывает реестр тегов при изменении тега.
+    """
+    transaction.on_commit(tag_registry.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(instance, **kwargs):
+    """
+    Строит варианты нового изображения рецепта после фиксации транзакции.
+    """
+    if not instance.image:
+        return
+    if (instance.image_variants or {}).get('source') == instance.image.name:
+        return
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: schedule_variants(recipe_id))
+
+
+def counter_delta(signal, created=False):
+    """
+    Изменение счетчика: +1 при создании строки, -1 при удалении.
+    """
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def count_favorites(signal, instance, created=False, **kwargs):
+    """
+    Пересчитывает счетчик избранного у рецепта.
+    """
+    adjust_counter(
+        Recipe, 'favorites_count', [instance.recipe_id],
+        counter_delta(signal, created))
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def count_carts(signal, instance, created=False, **kwargs):
+    """
+    Пересчитывает счетчик корзин у рецепта.
+    """
+    adjust_counter(
+        Recipe, 'in_carts_count', [instance.recipe_id],
+        counter_delta(signal, created))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def count_recipes(signal, instance, created=False, **kwargs):
+    """
+    Пересчитывает счетчик рецептов у автора.
+    """
+    adjust_counter(
+        UserModel, 'recipes_count', [instance.author_id],
+        counter_delta(signal, created))
+
+
+@receiver((post_save, post_delete), sender=Follow)
+def count_follows(signal, instance, created=False, **kwargs):
+    """
+    Пересчитывает счетчики подписчиков автора и подписок пользователя.
+    """
+    delta = counter_delta(signal, created)
+    adjust_counter(UserModel, 'followers_count', [instance.author_id], delta)
+    adjust_counter(UserModel, 'following_count', [instance.user_id], delta)
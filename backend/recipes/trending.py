@@ -0,0 +1,109 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Max, Value, When
+from django.utils import timezone
+
+from foodgram.constants import (
+    TRENDING_HALF_LIFE_HOURS,
+    TRENDING_MIN_SCORE,
+    TRENDING_WEIGHTS,
+    TRENDING_WINDOW_DAYS
+)
+from recipes.models import Favorite, RecipeTrend, ShoppingCart
+
+SOURCES = (
+    (Favorite, 'favorite'),
+    (ShoppingCart, 'shopping_cart'),
+)
+UPDATE_BATCH_SIZE = 500
+
+
+def decay_factor(seconds):
+    """
+    Во сколько раз уменьшается вклад события за seconds секунд.
+    """
+    return 0.5 ** (seconds / (TRENDING_HALF_LIFE_HOURS * 3600))
+
+
+def collect_scores(since, now):
+    """
+    Суммирует вклады добавлений в избранное и корзину за (since, now],
+    приведенные к моменту now.
+    """
+    scores = defaultdict(float)
+    for model, kind in SOURCES:
+        weight = TRENDING_WEIGHTS[kind]
+        rows = model.objects.filter(
+            created__gt=since, created__lte=now
+        ).values_list('recipe_id', 'created').order_by()
+        for recipe_id, created in rows.iterator():
+            scores[recipe_id] += weight * decay_factor(
+                (now - created).total_seconds())
+    return scores
+
+
+def add_scores(scores, now):
+    """
+    Прибавляет вклады к рейтингам, создавая недостающие строки.
+    """
+    RecipeTrend.objects.bulk_create(
+        [
+            RecipeTrend(recipe_id=recipe_id, score=0, updated_at=now)
+            for recipe_id in scores
+        ],
+        ignore_conflicts=True,
+    )
+    items = iter(scores.items())
+    while True:
+        batch = dict(islice(items, UPDATE_BATCH_SIZE))
+        if not batch:
+            return
+        RecipeTrend.objects.filter(recipe_id__in=batch).update(
+            score=F('score') + Case(
+                *(
+                    When(recipe_id=recipe_id, then=Value(score))
+                    for recipe_id, score in batch.items()
+                ),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+            updated_at=now,
+        )
+
+
+def refresh(full=False, now=None):
+    """
+    Обновляет рейтинги популярности рецептов.
+
+    Инкрементально: все рейтинги умножаются на коэффициент затухания
+    за время с прошлого пересчета, и к ним прибавляются только новые
+    события. Полный пересчет (full или пустая таблица) строит рейтинги
+    заново по событиям за TRENDING_WINDOW_DAYS; он же учитывает
+    удаления из избранного и корзины, которые инкрементальный путь
+    не видит.
+
+    Возвращает количество рецептов с новыми событиями.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        last = None
+        if not full:
+            last = RecipeTrend.objects.aggregate(
+                last=Max('updated_at'))['last']
+        if last is None:
+            RecipeTrend.objects.all().delete()
+            scores = collect_scores(
+                now - timedelta(days=TRENDING_WINDOW_DAYS), now)
+        else:
+            RecipeTrend.objects.update(
+                score=F('score') * decay_factor(
+                    (now - last).total_seconds()),
+                updated_at=now,
+            )
+            scores = collect_scores(last, now)
+        add_scores(scores, now)
+        RecipeTrend.objects.filter(score__lt=TRENDING_MIN_SCORE).delete()
+    return len(scores)
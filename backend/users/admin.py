@@ -1,7 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from recipes.models import Recipe
 from users.models import Follow, User
 
 
@@ -13,16 +12,19 @@ class UserAdmin(UserAdmin):
     search_fields = ('username', 'email')
 
     def num_following(self, obj):
-        return Follow.objects.filter(user=obj).count()
+        return obj.following_count
     num_following.short_description = 'Количество подписок'
+    num_following.admin_order_field = 'following_count'
 
     def num_followers(self, obj):
-        return Follow.objects.filter(author=obj).count()
+        return obj.followers_count
     num_followers.short_description = 'Количество подписчиков'
+    num_followers.admin_order_field = 'followers_count'
 
     def num_recipes(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        return obj.recipes_count
     num_recipes.short_description = 'Количество рецептов'
+    num_recipes.admin_order_field = 'recipes_count'
 
 
 @admin.register(Follow)
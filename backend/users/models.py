@@ -1,8 +1,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from foodgram.models import CounterFieldsMixin
 
-class User(AbstractUser):
+
+class User(CounterFieldsMixin, AbstractUser):
     """
     Пользователь с расширенным полем электронной почты.
     """
@@ -11,9 +13,25 @@ class User(AbstractUser):
         max_length=254,
         unique=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+    following_count = models.PositiveIntegerField(
+        'Количество подписок',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
+    counter_fields = ('recipes_count', 'followers_count', 'following_count')
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -3,14 +3,32 @@ from django.contrib.auth import get_user_model
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
-from rest_framework.fields import SerializerMethodField
+from rest_framework.fields import IntegerField, SerializerMethodField
 
-from users.models import Follow
+from api.compiled import CompiledReadMixin
+from api.flags import get_user_flags
 
 
 UserModel = get_user_model()
 
 
+def get_recipes_limit(request):
+    """
+    Возвращает ограничение recipes_limit из параметров запроса.
+
+    Без параметра возвращается None и рецепты не ограничиваются,
+    0 означает пустой список рецептов. На нецелое или отрицательное
+    значение поднимается ValidationError.
+    """
+    value = request.query_params.get('recipes_limit')
+    if value in (None, ''):
+        return None
+    try:
+        return IntegerField(min_value=0).run_validation(value)
+    except ValidationError as error:
+        raise ValidationError({'recipes_limit': error.detail})
+
+
 class CustomUserCreateSerializer(UserCreateSerializer):
     """
     Пользовательский сериализатор для создания пользователя.
@@ -62,7 +80,7 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         return email
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(CompiledReadMixin, UserSerializer):
     """
     Пользовательский сериализатор для пользователя.
     """
@@ -85,11 +103,10 @@ class CustomUserSerializer(UserSerializer):
         Возвращает информацию о том, подписан ли текущий
         пользователь на пользователя obj.
         """
-        user = self.context.get('request').user
-        return (
-            user.is_authenticated
-            and Follow.objects.filter(user=user, author=obj).exists()
-        )
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        request = self.context.get('request')
+        return get_user_flags(request).is_following(obj.id)
 
 
 class FollowSerializer(CustomUserSerializer):
@@ -107,14 +124,15 @@ class FollowSerializer(CustomUserSerializer):
     def validate(self, data):
         """
         Проверяет корректность данных при создании подписки.
+
+        Параметр recipes_limit проверяется до вставки подписки.
+        Повторная подписка отсекается ограничением уникальности
+        при вставке в CustomUserViewSet.subscribe.
         """
         author = self.instance
-        user = self.context.get('request').user
-        if Follow.objects.filter(author=author, user=user).exists():
-            raise ValidationError(
-                detail='Вы уже подписаны на этого пользователя!',
-                code=status.HTTP_400_BAD_REQUEST
-            )
+        request = self.context.get('request')
+        get_recipes_limit(request)
+        user = request.user
         if user == author:
             raise ValidationError(
                 detail='Вы не можете подписаться на самого себя!',
@@ -126,18 +144,20 @@ class FollowSerializer(CustomUserSerializer):
         """
         Возвращает количество рецептов у пользователя obj.
         """
-        return obj.recipes.count()
+        return obj.recipes_count
 
     def get_recipes(self, obj):
         """
         Возвращает список рецептов пользователя obj с ограничением по лимиту.
         """
         from api.serializers import RecipeShortSerializer
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-
-        if limit:
-            recipes = recipes[:int(limit)]
+        if hasattr(obj, 'preview_recipes'):
+            recipes = obj.preview_recipes
+        else:
+            limit = get_recipes_limit(self.context.get('request'))
+            recipes = obj.recipes.all()
+
+            if limit is not None:
+                recipes = recipes[:limit]
         serializer = RecipeShortSerializer(recipes, many=True, read_only=True)
         return serializer.data
@@ -1,19 +1,45 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import (
+    BooleanField,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value
+)
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from api.flags import UserFlags
+from api.serializers import BatchSerializer
+from api.utils import (
+    bulk_delete,
+    bulk_insert_ignore,
+    delete_returning,
+    insert_ignore
+)
 from api.pagination import CustomPagination
+from foodgram.replicas import ReplicaReadMixin
+from recipes.counters import adjust_counter
+from recipes.models import Recipe
 from users.models import Follow
-from users.serializers import CustomUserSerializer, FollowSerializer
+from users.serializers import (
+    CustomUserSerializer,
+    FollowSerializer,
+    get_recipes_limit
+)
 
 UserModel = get_user_model()
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(ReplicaReadMixin, UserViewSet):
     """
     Кастомный ViewSet для работы с пользователями.
     """
@@ -40,16 +66,65 @@ class CustomUserViewSet(UserViewSet):
                 context={"request": request}
             )
             serializer.is_valid(raise_exception=True)
-            Follow.objects.create(user=user, author=author)
+            if insert_ignore(Follow, user=user, author=author) is None:
+                raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Вы уже подписаны на этого пользователя!'
+                ]})
+            UserFlags.invalidate(user.id)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            subscription = get_object_or_404(Follow,
-                                             user=user,
-                                             author=author)
-            subscription.delete()
+            deleted = delete_returning(
+                Follow, user_id=user.id, author_id=author.id)
+            if not deleted:
+                raise Http404
+            UserFlags.invalidate(user.id)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=('post',),
+        permission_classes=(IsAuthenticated,),
+        url_path='subscribe/batch'
+    )
+    def subscribe_batch(self, request):
+        """
+        Пакетная подписка на авторов и отписка от них.
+        """
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        user = request.user
+        existing = set(UserModel.objects.filter(
+            id__in=data['add'] + data['remove']
+        ).values_list('id', flat=True))
+        invalid = {user.id}
+
+        with transaction.atomic():
+            added = bulk_insert_ignore(
+                Follow,
+                [
+                    Follow(user=user, author_id=pk)
+                    for pk in data['add']
+                    if pk in existing and pk not in invalid
+                ],
+                key='author_id'
+            )
+            removed = bulk_delete(
+                Follow, 'author_id',
+                [pk for pk in data['remove'] if pk in existing],
+                user_id=user.id
+            )
+            adjust_counter(UserModel, 'followers_count', added, 1)
+            adjust_counter(UserModel, 'followers_count', removed, -1)
+            adjust_counter(
+                UserModel, 'following_count', [user.id],
+                len(added) - len(removed))
+        if added or removed:
+            UserFlags.invalidate(user.id)
+        return Response(BatchSerializer.results(
+            data, existing, added, removed, invalid))
+
     @action(
         detail=False,
         permission_classes=(IsAuthenticated,)
@@ -59,7 +134,8 @@ class CustomUserViewSet(UserViewSet):
         Возвращает список подписок текущего пользователя.
         """
         user = request.user
-        queryset = UserModel.objects.filter(following__user=user)
+        queryset = self.get_subscriptions_queryset(
+            user, get_recipes_limit(request))
         pages = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             pages,
@@ -67,3 +143,25 @@ class CustomUserViewSet(UserViewSet):
             context={'request': request}
         )
         return self.get_paginated_response(serializer.data)
+
+    def get_subscriptions_queryset(self, user, recipes_limit=None):
+        """
+        Возвращает авторов, на которых подписан пользователь, с превью
+        последних рецептов, загруженными заранее.
+
+        recipes_limit - уже проверенное число из get_recipes_limit
+        или None.
+        """
+        recipes = Recipe.objects.all()
+        if recipes_limit == 0:
+            recipes = Recipe.objects.none()
+        elif recipes_limit is not None:
+            latest_ids = Recipe.objects.filter(
+                author=OuterRef('author')
+            ).values('id')[:recipes_limit]
+            recipes = recipes.filter(id__in=Subquery(latest_ids))
+        return UserModel.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('-id').prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='preview_recipes')
+        )